@@ -97,18 +97,34 @@ ExtensionHandlers = {
 # Standard python libraries
 import os
 import sys
-import subprocess # for calling REDline and returning output
 import re # for matching patterns, specifically looking for R3D sidecar quicktimes
+import threading # for sharing the XDCAM caches between the traversal threads
 import pdb # for debugging purposes
 from UserDict import UserDict
 
 # Custom dependencies
+import Stats # for timing each handler
+import Catalog # for skipping files that haven't changed since the last run
+import Traversal # for listing directories
+import REDline # for calling REDline and returning output
+import Devices # for limiting the probes on each device
+import QuickTime # for reading MOV and MP4 boxes without MediaInfo
+import Timecode # for timecode maths
 from seq import seq # assuming the seq/ directory is a subdirectory
+from seq import headers # for reading timecode etc. from DPX, EXR and ARRIRAW headers
 from lxml import etree # for XDCAM metadata
-from pytimecode import PyTimeCode
 from pymediainfo import MediaInfo # for MOV, AVI, MP4, metadata
 
 
+# runs REDline for R3DMetadata. replace it (e.g. with a different binary, concurrency
+# limit or timeout) before any worker processes are started.
+REDLINE = REDline.Runner()
+
+# limits the probes running on each device. replace it (with the root paths and limits)
+# before any worker processes are started
+DEVICES = Devices.Scheduler()
+
+
 class FileInfo(UserDict):
     "store file metadata"
 
@@ -125,7 +141,7 @@ def log(message):
         print " %s" % message
 
 class SEQMetadata(FileInfo):
-    "retrieve metadata from file sequences, based on file metadata alone"
+    "retrieve metadata from file sequences, based on their names and the header of the first frame (DPX, EXR, ARI)"
 
     def tapename(self, filename):
 
@@ -135,11 +151,36 @@ class SEQMetadata(FileInfo):
             return filename[0].split(".")[0]
 
 
+    def first_frame(self, filename):
+        "returns the full path to the first frame of the sequence"
+
+        return os.path.join(os.path.dirname(filename[5]), (filename[0] + filename[1]) % int(filename[2]))
+
     def parse(self, filename):
         self.clear()
 
-        src_in = PyTimeCode("23.98", frames=filename[2])
-        src_out = PyTimeCode("23.98", frames=filename[3]) + 1
+        duration = int(filename[3]) - int(filename[2]) + 1
+
+        # read the real timecode, framerate and resolution from the first frame's header, if we can
+        header = headers.ReadHeader(self.first_frame(filename)) or {}
+
+        if "framerate" in header:
+            framerate_str = "%g" % header["framerate"] # e.g. 23.976, 24, 29.97
+        else:
+            framerate_str = None
+
+        with Stats.timer("timecode"):
+            src_in = src_out = None
+
+            if "timecode" in header:
+                # if the header has a timecode but no framerate, use the usual 23.98
+                src_in = header["timecode"]
+                src_out = Timecode.offset(src_in, duration, framerate_str or "23.98") # exclusive
+
+            if src_out is None:
+                # no (usable) timecode in the header, so derive it from the frame numbers, at the header's rate if it has one
+                fps = Timecode.nominalRate(framerate_str) or 24
+                src_in, src_out = Timecode.fromFramesBatch([int(filename[2]), int(filename[3]) + 1], fps)
 
         # extract metadata here
         self["name"] = filename[4]
@@ -148,9 +189,55 @@ class SEQMetadata(FileInfo):
         self["tapename"] = self.tapename(filename)
         self["source_in"] = src_in
         self["source_out"] = src_out
-        self["duration"] = int(filename[3]) - int(filename[2]) + 1
+        self["duration"] = duration
+
+        if framerate_str is not None:
+            self["framerate"] = framerate_str
+
+        if "resolution" in header:
+            self["resolution"] = "%dx%d" % header["resolution"]
+
         return self
 
+# XDCAM clip folders hold every clip's MP4 next to one XML with the timecode for all of them,
+# so the folder listing and the XML are each looked at once per folder, not once per clip.
+# entries are keyed by mtime, so a folder or XML that changes is looked at again
+XDCAM_CACHE_SIZE = 1024 # folders (and XML files) remembered at once
+
+xdcamLock     = threading.Lock()
+xdcamSidecars = {} # (folder, mtime) -> path of the XML, or None if it isn't an XDCAM folder
+xdcamResults  = {} # (XML path, mtime, size) -> what xdcam_timecode returns for it
+
+def xdcamSidecar(root_dir):
+    "returns the path of the XDCAM XML in root_dir, or None if it isn't an XDCAM clip folder"
+
+    try:
+        key = (root_dir, os.stat(root_dir).st_mtime)
+    except OSError:
+        return None
+
+    with xdcamLock:
+        if key in xdcamSidecars:
+            return xdcamSidecars[key]
+
+    files       = sorted(os.listdir(root_dir))
+    extensions  = [ext[-3:].upper() for ext in files]
+    fullPath    = None
+
+    # match all the required files for an XDCAM clip
+    if "MP4" and "SMI" and "XML" and "PPN" and "BIM" in extensions:
+        if "XML" in extensions:
+            fullPath = os.path.join(root_dir, files[extensions.index("XML")])
+
+    with xdcamLock:
+        if len(xdcamSidecars) >= XDCAM_CACHE_SIZE:
+            xdcamSidecars.clear()
+
+        xdcamSidecars[key] = fullPath
+
+    return fullPath
+
+
 class VIDEOMetadata(FileInfo):
     "retrieve metadata from MOV, MP4, AVI, MXF, etc files (powered by MediaInfo)"
 
@@ -166,7 +253,10 @@ class VIDEOMetadata(FileInfo):
         return int(frames)
 
     def xdcam_timecode(self, filename):
-        "Extracts XDCAM timecode from the accompanying XML file"
+        """
+        Extracts XDCAM timecode from the accompanying XML file, as (source in, source out, duration).
+        Returns False if the clip isn't XDCAM, or its XML doesn't have a usable timecode.
+        """
 
         # a private function for unmunging the XDCAM timecode string
         def unmunge(timecode):
@@ -184,85 +274,126 @@ class VIDEOMetadata(FileInfo):
                 # fail
                 pass
 
-        # find XML file; return False if none found
-        root_dir    = os.path.dirname(filename)
-        files       = os.listdir(root_dir)
-        extensions  = [ext[-3:].upper() for ext in files]
+        # find XML file; return False if none found. the listing is shared by every clip in the folder
+        fullPath = xdcamSidecar(os.path.dirname(filename))
 
-        # match all the required files for an XDCAM clip
-        if "MP4" and "SMI" and "XML" and "PPN" and "BIM" in extensions:
-            log("xdcam_timecode: Extracting XDCAM metadata")
+        if fullPath is None:
+            return False # the clip isn't XDCAM
 
-            xmlFile = files[extensions.index("XML")]
-            fullPath = os.path.join(root_dir, xmlFile)
+        log("xdcam_timecode: Extracting XDCAM metadata")
 
-            # extract timecode
+        # the XML is shared by every clip in the folder too, so it's only read once
+        try:
+            st = os.stat(fullPath)
+        except OSError:
+            return False # gone since the folder was listed
 
-            # get tapename from the last component of the directory name
-            tapename = os.path.split(root_dir)[1]
+        key = (fullPath, st.st_mtime, st.st_size)
 
-            # load XML into etree and get root
-            try:
-                tree = etree.parse(fullPath)
-            except etree.XMLSyntaxError: # this will happen if the XML doesn't begin with a tag (<)
-                return "", "", "" # return blank
+        with xdcamLock:
+            result = xdcamResults.get(key)
 
-            root = tree.getroot() # <NonRealTimeMeta xmlns="urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20" xmlns:lib="urn:schemas-professionalDisc:lib:ver.1.20" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" lastUpdate="2013-12-16T14:41:19+02:00">
+        if result is not None:
+            return result
 
-            # extract namespace
-            root_namespace = root.nsmap[None] # urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20
+        result = self.xdcam_read(fullPath, unmunge)
 
-            # find LtcChangeTable (first, and hopefully only, instance)
-            try:
-                ltc_change_table = root.find("{%s}LtcChangeTable" % root_namespace)
-            except Exception as e:
-                return -1, -1 # no LTCChangeTable found
+        with xdcamLock:
+            if len(xdcamResults) >= XDCAM_CACHE_SIZE:
+                xdcamResults.clear()
 
-            # with LtcChangeTable, find two child nodes
-            ltc_nodes = ltc_change_table.findall("./{%s}LtcChange" % root_namespace)
+            xdcamResults[key] = result
 
-            # validate number of nodes
-            if len(ltc_nodes) != 2:
-                return -1, -1 # then we've got a problem
-            else:
-                # extract data out of nodes
-                start_node = ltc_nodes[0]
-                end_node = ltc_nodes[1]
+        return result
+
+    def xdcam_read(self, fullPath, unmunge):
+        "Reads the timecode from an XDCAM NonRealTimeMeta XML file"
+
+        # stream through the XML, stopping as soon as the LtcChangeTable is done, rather
+        # than building a tree of the whole file. the table is a child of the root:
+        # <NonRealTimeMeta xmlns="urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20" xmlns:lib="urn:schemas-professionalDisc:lib:ver.1.20" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" lastUpdate="2013-12-16T14:41:19+02:00">
+        ltc_change_table = None
+
+        try:
+            with Stats.timer("xdcam.xml") as t:
+                with open(fullPath, "rb") as f:
+                    root_namespace = None
+                    depth = 0
+
+                    for event, element in etree.iterparse(f, events=("start", "end")):
+                        if event == "start":
+                            if depth == 0:
+                                # extract namespace from the root. urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20
+                                root_namespace = element.nsmap.get(None)
 
+                            depth += 1
+                            continue
+
+                        depth -= 1
+
+                        # find LtcChangeTable (first, and hopefully only, instance)
+                        if depth == 1 and element.tag == "{%s}LtcChangeTable" % root_namespace:
+                            ltc_change_table = element
+                            break
+
+                    t.bytes += f.tell()
+
+        except (etree.XMLSyntaxError, IOError): # this will happen if the XML doesn't begin with a tag (<)
+            return False
+
+        if ltc_change_table is None:
+            return False # no LTCChangeTable found
+
+        # with LtcChangeTable, find two child nodes
+        ltc_nodes = ltc_change_table.findall("./{%s}LtcChange" % root_namespace)
+
+        # validate number of nodes
+        if len(ltc_nodes) != 2:
+            return False # then we've got a problem
+        else:
+            # extract data out of nodes
+            start_node = ltc_nodes[0]
+            end_node = ltc_nodes[1]
+
+            try:
                 if start_node.attrib["status"] == "increment":
                     start_framecount = int(start_node.attrib["frameCount"])
                     start_timecode = unmunge(start_node.attrib["value"])
 
                     # timecode - 00130500 = 00:05:13:00
                 else:
-                    return -1, -1 # raise hell
+                    return False # raise hell
 
                 if end_node.attrib["status"] == "end":
                     end_framecount = int(end_node.attrib["frameCount"])
                     end_timecode = unmunge(end_node.attrib["value"])
+                else:
+                    return False # raise hell
 
-                    # make TC exclusive
-                    end_timecode = PyTimeCode("23.98",end_timecode) + 1 # warning: framerate is hard-coded!
+            except (KeyError, ValueError):
+                return False # a missing attribute, or a frame count that isn't a number
 
-                else:
-                    return -1, -1 # raise hell
+            if start_timecode is None or end_timecode is None:
+                return False # a value that isn't 8 digits
 
-                duration = end_framecount + 1
+            # make TC exclusive
+            with Stats.timer("timecode"):
+                end_timecode = Timecode.offset(end_timecode, 1, "23.98") # warning: framerate is hard-coded!
 
-                # return the timecode
-                log("xdcam_timecode: returning %s, %s, %s" % (str(start_timecode), str(end_timecode), str(duration)))
-                return str(start_timecode), str(end_timecode), str(duration)
-        else:
-            return False # the clip isn't XDCAM
+            if end_timecode is None:
+                return False
+
+            duration = end_framecount + 1
+
+            # return the timecode
+            log("xdcam_timecode: returning %s, %s, %s" % (str(start_timecode), str(end_timecode), str(duration)))
+            return str(start_timecode), str(end_timecode), str(duration)
 
 
 
     def parse(self, filename):
         self.clear()
 
-        qt_file = MediaInfo.parse(filename)
-        log("VIDEOMetadata __parse: qt_file = %s" % str(filename))
-
         # ignore if it's an R3D proxy
         qt_filename = os.path.basename(filename).upper() # uppercase everything just in case.. haha
         match = re.search(r'([A-Z][0-9]{3}_){2}[A-Z0-9]{6}_[HFMP].MOV$', qt_filename) # match against B165_C002_1116QL_F.mov
@@ -285,40 +416,56 @@ class VIDEOMetadata(FileInfo):
         tapename = filename_base
         media_format = "video_%s" % filename_ext.lower()
 
-        # open tracks and detect type
-        for track in qt_file.tracks:
-            log("track type = %s" % track.track_type)
+        # read the boxes of a MOV or MP4 directly, if we can. this only reads the moov box
+        # and the first timecode sample, rather than everything MediaInfo looks at
+        qt_info = QuickTime.probe(filename)
 
-            # grab metadata from the video track
-            if track.track_type == "Video":
+        if qt_info is not None:
+            log("VIDEOMetadata __parse: read %s directly" % str(filename))
 
-                # grab framerate as a string
-                framerate_str = str(track.frame_rate)
+            framerate_str = qt_info["framerate"]
+            duration = qt_info["frames"]
+            tc = qt_info["timecode"]
 
-                # grab framerate as a float # for calculating duration
-                framerate = float(framerate_str)
+        else:
+            with Stats.timer("mediainfo.parse"):
+                qt_file = MediaInfo.parse(filename)
+            log("VIDEOMetadata __parse: qt_file = %s" % str(filename))
 
-                # calculate duration
-                duration = self.milliseconds_to_frames(track.duration, framerate)
+            # open tracks and detect type
+            for track in qt_file.tracks:
+                log("track type = %s" % track.track_type)
 
-            # grab timecode from the "other" track
-            elif track.track_type == "Other":
+                # grab metadata from the video track
+                if track.track_type == "Video":
 
-                # grab starting TC
-                tc = track.time_code_of_first_frame
+                    # grab framerate as a string
+                    framerate_str = str(track.frame_rate)
 
-                # calculate duration based on reported duration in this track
-                # it should be the same
-                duration_other = self.milliseconds_to_frames(track.duration, framerate)
+                    # grab framerate as a float # for calculating duration
+                    framerate = float(framerate_str)
 
-                # if the duration isn't the same, raise an error
-                if duration_other != duration:
-                    raise Exception("Mismatched track duration") # is this the best way to handle?
+                    # calculate duration
+                    duration = self.milliseconds_to_frames(track.duration, framerate)
 
-            # skip if the track is of no interest to us
-            elif track.track_type == "General" \
-                or track.track_type[:5] == "Audio":
-                    continue
+                # grab timecode from the "other" track
+                elif track.track_type == "Other":
+
+                    # grab starting TC
+                    tc = track.time_code_of_first_frame
+
+                    # calculate duration based on reported duration in this track
+                    # it should be the same
+                    duration_other = self.milliseconds_to_frames(track.duration, framerate)
+
+                    # if the duration isn't the same, raise an error
+                    if duration_other != duration:
+                        raise Exception("Mismatched track duration") # is this the best way to handle?
+
+                # skip if the track is of no interest to us
+                elif track.track_type == "General" \
+                    or track.track_type[:5] == "Audio":
+                        continue
 
         # quit if no video track was detected
         # we can tell this because framerate_str never got
@@ -346,14 +493,9 @@ class VIDEOMetadata(FileInfo):
                 # catch empty TC fields, if this wasn't set by the "Other" track or XDCAM
                 tc = "00:00:00:00"
 
-            # set end TC
-            if framerate_str == "23.976" or framerate_str == "23.98":
-                framerate_tc_calc = "23.98" # for pytimecode, convert the string
-            else:
-                framerate_tc_calc = framerate_str.split(".")[0] # remove any 'floatiness' and just return a straight-up int as a string
-
             # calculate end tc, exclusive
-            tc_end = PyTimeCode(framerate_tc_calc,tc) + int(duration)
+            with Stats.timer("timecode"):
+                tc_end = Timecode.offset(tc, int(duration), framerate_str) or ""
 
 
         # finish up
@@ -371,6 +513,38 @@ class VIDEOMetadata(FileInfo):
 
 
 
+def readR3DHeaders(filename):
+    "returns as many of REDline's fields for an _001.R3D clip as can be read from its headers (everything but the timecode), or None"
+
+    header = headers.ReadR3DHeader(filename)
+
+    if header is None:
+        return None # not a RED1 file
+
+    metadata = {"File Path": filename,
+                "Clip Name": os.path.basename(filename)[:-8]} # A001_C002_1116QL_001.R3D is clip A001_C002_1116QL
+
+    if "framerate" in header:
+        metadata["Record FPS"] = ("%.3f" % header["framerate"]).rstrip("0").rstrip(".") # e.g. 23.976, 25
+
+    # the clip's frames are split over its segments (_001.R3D, _002.R3D, ...), so add them all up
+    frames = 0
+    segment = 1
+
+    while header is not None and "frames" in header:
+        frames += header["frames"]
+        segment += 1
+
+        path = "%s%03d.R3D" % (filename[:-7], segment)
+
+        if not os.path.exists(path):
+            metadata["Total Frames"] = str(frames)
+            break
+
+        header = headers.ReadR3DHeader(path)
+
+    return metadata
+
 class R3DMetadata(FileInfo):
     "retrieve metadata from an R3D file"
 
@@ -385,38 +559,35 @@ class R3DMetadata(FileInfo):
                 log("R3DMetadata: not _001.R3D")
                 return False
 
-            # run a REDline command dumping all metadata + header from the R3D
-            p = subprocess.Popen(['REDline -i "%s" --printMeta 3' % filename],shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+            # run REDline, dumping all metadata + header from the R3D.
+            # this will block until the output is ready (or REDline times out)
+            metadata = REDLINE.printMeta(filename)
+
+            if metadata is None:
+                # REDline failed, timed out or isn't installed. the headers have everything but the
+                # timecode, which is better than nothing. the row isn't kept in the catalog, so the
+                # clip gets another go with REDline next time
+                metadata = readR3DHeaders(filename)
 
-            # retrieve the output of this command
-            # this will block until the output is ready
-            # strip() will get rid of any spurious newlines at the start and end
-            r3dmeta = p.communicate()[0].strip()
+                if metadata is None:
+                    log("R3DMetadata: REDline failed for %s" % filename)
+                    return self
 
-            # retrieve headers and metadata
-            headers = r3dmeta.splitlines()[0].split(",")
-            metadata = r3dmeta.splitlines()[1].split(",")
+                log("R3DMetadata: REDline failed for %s, using its headers" % filename)
 
             # retrieve specific metadata fields. more can be added in a similar fashion
             self["name"]        = str(filename)
             self["format"]      = media_format
-            self["filepath"]    = metadata[headers.index("File Path")]
-            self["tapename"]    = metadata[headers.index("Clip Name")]
-            self["source_in"]   = metadata[headers.index("Abs TC")]
-            self["source_out"]  = metadata[headers.index("End Abs TC")]
-            self["duration"]    = metadata[headers.index("Total Frames")]
-            self["framerate"]   = metadata[headers.index("Record FPS")]
-
-            # set end TC
-            if self["framerate"] == "23.976":
-                # pytimecode needs to see '23.98' instead of 23.976
-                framerate_tc_calc = "23.98"
+            self["filepath"]    = metadata["File Path"]
+            self["tapename"]    = metadata["Clip Name"]
+            self["source_in"]   = metadata.get("Abs TC", "")
+            self["source_out"]  = metadata.get("End Abs TC", "")
+            self["duration"]    = metadata.get("Total Frames", "")
+            self["framerate"]   = metadata.get("Record FPS", "")
 
-            else:
-                # if it's another value, pass it right on through
-                framerate_tc_calc = self["framerate"]
-
-            self["source_out"] = PyTimeCode(framerate_tc_calc, self["source_out"]) + 1 # make TC exclusive
+            if self["source_out"]:
+                with Stats.timer("timecode"):
+                    self["source_out"] = Timecode.offset(self["source_out"], 1, self["framerate"]) or "" # make TC exclusive
 
         except:
             pass # if there are any errors in the above, no fields except name will be set
@@ -426,15 +597,248 @@ class R3DMetadata(FileInfo):
         return self
 
 
-def listDirectory(directory, streamingExtList=ExtensionHandlers["StreamingMedia"].keys(), sequenceExtList=ExtensionHandlers["SequenceMedia"].keys()):
+def getFileInfoClass(filename, module=sys.modules[FileInfo.__module__]):
+    "get file info class from filename extension"
+
+    global ExtensionHandlers
+
+    # this function gets a filename and a module
+    # the module is the file that contains all of the metadata classes, in this case CameraMetadata.py
+    # using this, it can use the extension of the filename to check and see
+    # if there's a class that can process that kind of file (.e.g .r3d = R3DMetadata)
+    if type(filename) is list:
+        extension = filename[1][1:].upper()
+        handlers = ExtensionHandlers["SequenceMedia"]
+    else:
+        extension = os.path.splitext(filename)[1].upper()[1:]
+        handlers = ExtensionHandlers["StreamingMedia"]
+
+    try:
+        subclass = "%s" % handlers[extension] # based on extension, this will return the class name (e.g. R3DMetadata, VIDEOMetadata, etc)
+    except KeyError:
+        subclass = extension # if the extension is registered, just pass the extension through and hope to get lucky
+
+    return hasattr(module, subclass) and getattr(module, subclass) or FileInfo
+
+
+def parseStreamingFile(filename):
+    "parse a single streaming media file, returning its metadata as a plain dict (empty if there is none), or None if its handler raised"
+
+    # Why the double f? Because getFileInfoClass(f) will actually return a class object, which we then
+    # want to use to parse the file. So it expands like so:
+    #
+    # getFileInfoClass("file.r3d") --> R3DMetadata
+    # R3DMetadata("file.r3d")
+    #
+    # A plain dict is returned, rather than the FileInfo subclass itself, so that results can be
+    # sent back from the worker processes when listDirectory is given a pool.
+    info = parseFile(getFileInfoClass(filename), filename)
+
+    if info is None:
+        return None
+
+    if not info:
+        return {}
+
+    return dict(info)
+
+
+def incomplete(filename, fields):
+    "returns True if fields for filename are missing what a later run could fill in, so they shouldn't be kept in the catalog"
+
+    # the handler raised, so there's nothing to keep
+    if fields is None:
+        return True
+
+    # REDline timed out, failed or isn't installed, so the clip has no timecode
+    return filename[-8:] == "_001.R3D" and not fields.get("source_in")
+
+
+def parseStreamingFileInWorker(filename):
+    "parseStreamingFile, for a worker process. returns (metadata, stats), so the stats can be merged back into the main process."
+
+    return parseStreamingFile(filename), Stats.drain()
+
+
+def devicePath(filename):
+    "the path of filename (or a sequence) to hold a device slot on"
+
+    return filename[5] if type(filename) is list else filename
+
+
+def parseFile(handler, filename):
+    "parse filename (or a sequence) with handler, holding a slot on its device"
+
+    with DEVICES.slot(devicePath(filename)):
+        return runHandler(handler, filename)
+
+
+def runHandler(handler, filename):
+    """
+    parse filename (or a sequence) with handler, timing it under the handler's name. the caller holds the device slot.
+    if the handler raises (e.g. on a file it can't make sense of), it's reported and None is returned, so one bad
+    file doesn't stop the scan.
+    """
+
+    with Stats.timer("handler.%s" % handler.__name__):
+        try:
+            return handler(filename).parse(filename)
+        except Exception as e:
+            Stats.count("handler.errors")
+            sys.stderr.write(" ** Couldn't read %s: %s **\n" % (devicePath(filename), str(e) or e.__class__.__name__))
+            return None
+
+
+def sequenceFingerprint(s):
+    "fingerprint for a sequence: its frame range and total size, plus the content of its first frame"
+
+    return Catalog.fileFingerprint(SEQMetadata().first_frame(s), s[2], s[3], s[6])
+
+
+def frameMtimes(entries):
+    "returns a dict of name -> mtime for a directory's entries, from their (cached) stat results"
+
+    mtimes = {}
+
+    for e in entries:
+        try:
+            mtimes[e.name] = e.stat().st_mtime
+        except OSError:
+            pass # gone since the directory was listed
+
+    return mtimes
+
+def sequenceMtime(s, mtimes):
+    "returns the newest mtime of a sequence's frames, from frameMtimes()"
+
+    pattern = s[0] + s[1] # e.g. 'A001.' + '%07d.dpx'
+
+    return max(mtimes.get(pattern % n, 0) for n in xrange(int(s[2]), int(s[3]) + 1))
+
+
+def relocateFields(filename, oldpath, fields):
+    "updates the path-derived fields of a catalog entry that was stored under oldpath, for filename. returns None if they can't be reused."
+
+    if not fields:
+        return None # empty results come from the name (R3D spans, sidecars), so the new name has to be looked at again
+
+    fields = dict(fields)
+
+    if type(filename) is list:
+        # a sequence. its timecode comes from the frame numbers or the header, which the fingerprint covers
+        fields["name"]      = filename[4]
+        fields["filepath"]  = filename[5]
+        fields["tapename"]  = SEQMetadata().tapename(filename)
+        return fields
+
+    if fields.get("format") == "video_mp4":
+        return None # could be XDCAM, whose timecode comes from the XML next to it, not the file
+
+    # the name and filepath are the path, and the tapename of a quicktime is its filename without the extension.
+    # an R3D's is its clip name, without the segment suffix as well (A001_C002_1116QL_001.R3D is A001_C002_1116QL)
+    if fields.get("format") == "r3d":
+        oldtape = os.path.basename(oldpath)[:-8]
+        newtape = os.path.basename(filename)[:-8]
+    else:
+        oldtape = os.path.basename(oldpath).split(".")[0]
+        newtape = os.path.basename(filename).split(".")[0]
+
+    for k, v in fields.items():
+        if v == oldpath:
+            fields[k] = filename
+        elif k == "tapename" and v == oldtape:
+            fields[k] = newtape
+
+    return fields
+
+
+def catalogRelocate(catalog, filename, path, fingerprint):
+    "returns a FileInfo for a file the catalog knows by another path (i.e. it was moved or renamed), or None"
+
+    oldpath, fields = catalog.lookupFingerprint(fingerprint)
+
+    if fields is None or oldpath == path:
+        return None
+
+    fields = relocateFields(filename, oldpath, fields)
+
+    if fields is None:
+        return None
+
+    log("catalogRelocate: %s was moved from %s" % (path, oldpath))
+    Stats.count("catalog.relocated")
+
+    info = FileInfo(filename)
+    info.update(fields)
+    return info
+
+
+def catalogLookup(catalog, filename, path, size, mtime, inode):
+    "returns a FileInfo with the catalog's fields for path, or None if it has nothing up-to-date"
+
+    fields = catalog.lookup(path, size, mtime, inode)
+
+    if fields is None:
+        Stats.count("catalog.misses")
+        return None
+
+    log("catalogLookup: catalog hit for %s" % path)
+    Stats.count("catalog.hits")
+
+    info = FileInfo(filename)
+    info.update(fields)
+    return info
+
+
+def parseWithCatalog(handler, filename, catalog, path, size, mtime, inode, fingerprint=None):
+    """
+    parse filename with handler, unless the catalog already has an up-to-date result for it.
+    fingerprint is an optional function that returns the fingerprint of filename. it's only
+    called if the catalog doesn't know path, to see if it's been moved from somewhere else.
+    """
+
+    info = catalogLookup(catalog, filename, path, size, mtime, inode)
+
+    if info is not None:
+        return info
+
+    # the fingerprint is read under the same slot as the parse, so it counts against the device's limits too
+    with DEVICES.slot(devicePath(filename)):
+        if fingerprint is not None:
+            fingerprint = fingerprint(filename)
+            info = catalogRelocate(catalog, filename, path, fingerprint)
+
+        if info is None:
+            info = runHandler(handler, filename)
+
+    # store empty results too, so files that don't produce metadata are skipped next time.
+    # but not ones whose handler raised, so they're tried again
+    if info is not None:
+        catalog.store(path, size, mtime, inode, info or {}, fingerprint)
+
+    return info
+
+
+def listDirectory(directory, streamingExtList=ExtensionHandlers["StreamingMedia"].keys(), sequenceExtList=ExtensionHandlers["SequenceMedia"].keys(), catalog=None, entries=None, pool=None):
     "get list of file info objects for files of particular extensions"
 
     """
     This is the handler that passes files to specific classes.
+
+    If a Catalog is passed in, files and sequences it already knows about
+    (and that haven't changed since) are returned from the catalog instead
+    of being parsed again. So are files and sequences that have only been
+    moved or renamed, which are recognised by their content fingerprint.
+
+    If the directory has already been listed (e.g. by Traversal.walk), its
+    entries can be passed in so that it isn't listed a second time.
+
+    If a multiprocessing.Pool is passed in, the streaming media files are
+    parsed in its worker processes.
     """
 
     # guardian checks
-    if os.path.isdir(directory) is False:
+    if entries is None and os.path.isdir(directory) is False:
         return False
 
     if type(streamingExtList) is not list:
@@ -444,64 +848,112 @@ def listDirectory(directory, streamingExtList=ExtensionHandlers["StreamingMedia"
     # normalize the extensions to uppercase
     streamingExtList = [e.upper() for e in streamingExtList]
 
-    # create a dictionary with all the files in the directory, normalized
+    # list the directory once. the same entries are used both for picking out
+    # the streaming media and for grouping sequences, and each entry caches its
+    # stat result, so every file is only touched once.
+    if entries is None:
+        entries = Traversal.scanDirectory(directory)
+
+    files = [e for e in entries if not e.is_dir()]
+
+    # filter the files to only include qualifying extensions, with their names normalized
     # http://docs.python.org/2/library/os.path.html#os.path.normcase
-    fileList = [os.path.normcase(f)
-                for f in os.listdir(directory)]
+    streamingEntries = [e for e in files
+                          if os.path.splitext(os.path.normcase(e.name))[1].upper()[1:] in streamingExtList]
 
-    # update the filelist to include the full path to the file
-    # at the same time, filter this list to only include qualifying extensions
-    fileList = [os.path.join(directory, f)
-                for f in fileList
-                  if os.path.splitext(f)[1].upper()[1:] in streamingExtList]
+    # build the filelist with the full path to each file
+    fileList = [os.path.join(directory, os.path.normcase(e.name))
+                for e in streamingEntries]
 
     # get a list of sequences (if any) in the current directory
-    seqList = seq.SequenceList(directory).GetSequences(False) # recursive=False
+    with Stats.timer("sequences.group"):
+        seqList = seq.SequenceList(directory).GetSequences(False, files) # recursive=False
 
-    def getFileInfoClass(filename, module=sys.modules[FileInfo.__module__]):
-        "get file info class from filename extension"
+    # only the files the catalog doesn't already know about (or that have changed since) need parsing
+    file_info = [None] * len(fileList)
+    toParse   = [] # (index into fileList, catalog key, fingerprint) for each file that needs parsing
 
-        global ExtensionHandlers
+    for n, (f, e) in enumerate(zip(fileList, streamingEntries)):
+        key = None
+        fingerprint = None
 
-        # this function gets a filename and a module
-        # the module is the file that contains all of the metadata classes, in this case CameraMetadata.py
-        # using this, it can use the extension of the filename to check and see
-        # if there's a class that can process that kind of file (.e.g .r3d = R3DMetadata)
-        if type(filename) is list:
-            extension = filename[1][1:].upper()
-            handlers = ExtensionHandlers["SequenceMedia"]
-        else:
-            extension = os.path.splitext(filename)[1].upper()[1:]
-            handlers = ExtensionHandlers["StreamingMedia"]
+        if catalog is not None:
+            key = Catalog.statKey(e.stat())
+            file_info[n] = catalogLookup(catalog, f, f, *key)
 
-        try:
-            subclass = "%s" % handlers[extension] # based on extension, this will return the class name (e.g. R3DMetadata, VIDEOMetadata, etc)
-        except KeyError:
-            subclass = extension # if the extension is registered, just pass the extension through and hope to get lucky
+            if file_info[n] is not None:
+                continue
 
-        return hasattr(module, subclass) and getattr(module, subclass) or FileInfo
+            # R3D spans other than _001 are skipped on their name alone, so there's no point reading them
+            if f[-4:] != ".R3D" or f[-8:] == "_001.R3D":
+                with DEVICES.slot(f):
+                    fingerprint = Catalog.fileFingerprint(f)
 
-    # listDirectory returns this gem.
-    # Why the double f? Because getFileInfoClass(f) will actually return a class object, which we then
-    # want to use to parse the file. So it expands like so:
-    #
-    # getFileInfoClass("file.r3d") --> R3DMetadata
-    # R3DMetadata("file.r3d")
-    #
-    # The for loop will ensure that data is returned for every file in the fileList
+                file_info[n] = catalogRelocate(catalog, f, f, fingerprint)
+
+                if file_info[n] is not None:
+                    catalog.store(f, key[0], key[1], key[2], file_info[n], fingerprint)
+                    continue
+
+        toParse.append((n, key, fingerprint))
 
+    # parse the rest. with a pool, they're fanned out to the worker processes; the pool is shared
+    # by every directory being processed, so files from several directories get parsed at once
+    filenames = [fileList[n] for n, key, fingerprint in toParse]
 
-    file_info = [getFileInfoClass(f)(f).parse(f) for f in fileList]
+    if pool is not None:
+        parsed = []
 
-    # Prune empty lists from file_info, in cases where a file was passed to a parser
-    # but returned empty (e.g. an R3D file other than _001.R3D)
-    file_info = [i for i in file_info if len(i) != 0]
+        for fields, stats in pool.map(parseStreamingFileInWorker, filenames, 1): # chunksize of 1, as every file is slow
+            Stats.merge(stats)
+            parsed.append(fields)
+    else:
+        parsed = [None] * len(filenames)
+
+        # each R3D means waiting on a REDline process, so run several at once
+        r3ds = [n for n, f in enumerate(filenames) if f[-8:] == "_001.R3D"]
+
+        for n, fields in zip(r3ds, REDline.threadMap(parseStreamingFile, [filenames[n] for n in r3ds], REDLINE.concurrency)):
+            parsed[n] = fields
+
+        for n, f in enumerate(filenames):
+            if parsed[n] is None:
+                parsed[n] = parseStreamingFile(f)
+
+    for (n, key, fingerprint), fields in zip(toParse, parsed):
+        f = fileList[n]
+
+        # store empty results too, so files that don't produce metadata are skipped next time.
+        # but not clips REDline couldn't read, or files whose handler raised, so they're tried again
+        if catalog is not None and not incomplete(f, fields):
+            catalog.store(f, key[0], key[1], key[2], fields, fingerprint)
+
+        file_info[n] = FileInfo(f)
+        file_info[n].update(fields or {})
+
+    # Prune empty results from file_info, in cases where a file was passed to a parser
+    # but returned empty (e.g. an R3D file other than _001.R3D, or an R3D sidecar)
+    file_info = [i for i in file_info if i]
 
     if seqList:
         seqList = [s for s in seqList if s[1][1:].upper() in sequenceExtList]
 
-        seq_info = [getFileInfoClass(f)(f).parse(f) for f in seqList]
-        file_info = file_info + seq_info
+        if catalog is None:
+            seq_info = [parseFile(getFileInfoClass(f), f) for f in seqList]
+        else:
+            # sequences are keyed on their total size, the newest mtime of their frames (frames
+            # rewritten in place don't change the directory's mtime) and the inode of the directory
+            dir_stat = os.stat(directory)
+            mtimes = frameMtimes(files)
+
+            seq_info = [parseWithCatalog(getFileInfoClass(f), f, catalog, f[5], f[6], sequenceMtime(f, mtimes), dir_stat.st_ino,
+                                         sequenceFingerprint)
+                        for f in seqList]
+
+        file_info = file_info + [i for i in seq_info if i is not None] # None if the handler raised
+
+    if catalog is not None:
+        catalog.commit()
 
 
 
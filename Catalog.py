@@ -0,0 +1,185 @@
+"""
+Catalog
+
+Keeps a persistent record of parsed media in an SQLite database, so that
+re-running the indexer over a volume only sends new or modified files
+through the CameraMetadata handlers.
+
+Every entry is keyed by path, size, mtime and inode. If all four still
+match on the next run, the stored fields are returned as-is. Files that
+were looked at but produced no metadata (R3D spans other than _001, R3D
+sidecar quicktimes, etc.) are stored with an empty field set, so they get
+skipped too.
+
+Sequences don't have a single stat result of their own. They are keyed on
+their formatted path (which includes the frame range), the total size of
+their frames, and the mtime/inode of the containing directory.
+
+Each entry also stores a fingerprint of the file's content: a hash of its
+size plus its first and last 64 KB. When a volume gets reorganised, a file
+that turns up at a new path can be matched to its old entry by fingerprint,
+so it doesn't have to be parsed again.
+
+
+USAGE:
+    import Catalog
+    catalog = Catalog.Catalog("/project/MediaIndexer.catalog")
+
+    fields = catalog.lookup(path, size, mtime, inode) # None if unknown or stale
+    catalog.store(path, size, mtime, inode, fields, Catalog.fileFingerprint(path))
+    catalog.commit()
+
+    # for a file that's new to the catalog, see if it's just moved
+    oldpath, fields = catalog.lookupFingerprint(Catalog.fileFingerprint(path)) # (None, None) if not
+
+    catalog.close()
+"""
+
+# Standard python libraries
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Custom dependencies
+import Stats
+
+
+# bump this whenever the layout of the table, or the fields produced by the
+# handlers, change. an out-of-date catalog is simply thrown away and rebuilt.
+SCHEMA_VERSION = 4
+
+# how much of the start and end of a file goes into its fingerprint
+FINGERPRINT_BYTES = 65536
+
+
+def statKey(st):
+    "Returns the (size, mtime, inode) part of a catalog key from an os.stat result"
+
+    return st.st_size, st.st_mtime, st.st_ino
+
+def fileFingerprint(path, *extra):
+    """
+    Returns a fingerprint of the file's content: a hash of its size and its first and last
+    FINGERPRINT_BYTES. Anything in 'extra' is hashed too. Returns None if the file can't be read.
+    """
+
+    fingerprint = hashlib.sha1()
+
+    try:
+        with open(path, "rb") as f, Stats.timer("catalog.fingerprint") as t:
+            size = os.fstat(f.fileno()).st_size
+
+            data = f.read(FINGERPRINT_BYTES)
+            fingerprint.update("%d:" % size)
+            fingerprint.update(data)
+            t.bytes += len(data)
+
+            if size > FINGERPRINT_BYTES:
+                f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+                data = f.read(FINGERPRINT_BYTES)
+                fingerprint.update(data)
+                t.bytes += len(data)
+
+    except (IOError, OSError):
+        return None
+
+    for e in extra:
+        fingerprint.update(":%s" % str(e))
+
+    return fingerprint.hexdigest()
+
+
+class Catalog:
+    "SQLite-backed store of previously parsed FileInfo fields. Safe to share between threads."
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.text_factory = str # paths are byte strings, and should come back that way
+
+        # the catalog is a cache: if it's lost, the next run just rebuilds it.
+        # so trade a bit of durability for speed.
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA journal_mode = MEMORY")
+
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+
+        if version != SCHEMA_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS media")
+            self.db.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+        self.db.execute("""CREATE TABLE IF NOT EXISTS media (
+                               path     TEXT PRIMARY KEY,
+                               size     INTEGER,
+                               mtime    REAL,
+                               inode    INTEGER,
+                               fields   TEXT,
+                               fingerprint TEXT
+                           )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS media_fingerprint ON media (fingerprint)")
+        self.db.commit()
+
+    def lookup(self, path, size, mtime, inode):
+        "Returns the stored fields for path, or None if it's missing or has changed since"
+
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime, inode, fields FROM media WHERE path = ?",
+                                  (path,)).fetchone()
+
+        if row is None or row[:3] != (size, mtime, inode):
+            return None
+
+        return decodeFields(row[3])
+
+    def lookupFingerprint(self, fingerprint):
+        "Returns (path, fields) for an entry with the given content fingerprint, or (None, None)"
+
+        if fingerprint is None:
+            return None, None
+
+        with self.lock:
+            row = self.db.execute("SELECT path, fields FROM media WHERE fingerprint = ? LIMIT 1",
+                                  (fingerprint,)).fetchone()
+
+        if row is None:
+            return None, None
+
+        return row[0], decodeFields(row[1])
+
+    def store(self, path, size, mtime, inode, fields, fingerprint=None):
+        "Stores the fields (and optionally content fingerprint) for path. Call commit() to write them out."
+
+        data = encodeFields(fields)
+
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO media (path, size, mtime, inode, fields, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+                            (path, size, mtime, inode, data, fingerprint))
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+
+def encodeFields(fields):
+    "Serializes a FileInfo (or any dict) for storage"
+
+    # values can be strings, ints, etc. they all end up as strings in
+    # the CSV anyway, so store them the same way.
+    # latin-1 maps every byte to a code point, so byte string paths that aren't
+    # valid UTF-8 survive the round trip untouched.
+    return json.dumps(dict((k, str(v)) for k, v in fields.items()), encoding="latin-1")
+
+def decodeFields(data):
+    "Reverses encodeFields, returning a dict of byte strings"
+
+    return dict((k.encode("latin-1"), v.encode("latin-1"))
+                for k, v in json.loads(data).items())
@@ -0,0 +1,223 @@
+"""
+Devices
+
+Limits how hard the metadata probes (header reads, MediaInfo, REDline, and
+the catalog's fingerprint reads) hit each storage device, when the root
+paths are spread over several of them (a RAID, an LTFS tape, an NFS share,
+etc.), so a scan can keep every device busy without swamping any of them
+for the other people using it.
+
+Files are put on a device by the st_dev of their directory. Each device
+gets its own limit on the number of probes running on it at once, and
+optionally a limit on the bytes a second they read, so a slow device
+doesn't hold up a fast one, and a fast one doesn't starve a slow one.
+
+The limits are multiprocessing semaphores and shared values, so they hold
+across the worker processes too, as long as the Scheduler is created (with
+the root paths) before they're started. That finds the devices of the root
+paths and of every mount point under them, from /proc/mounts where there is
+one. A device that turns up later (something mounted mid-scan) gets limits
+of its own, but only within each process.
+
+The bytes a probe read are taken from the thread's rchar count in
+/proc/thread-self/io, which covers everything read in the thread, including
+MediaInfo's reads. It doesn't cover REDline, which runs in a process of its
+own, so only the probe limit applies to that. Where /proc/thread-self isn't
+available (anything but Linux 3.17 or later), there's no bytes a second
+limit. Since a probe is only charged once it has finished, the probes
+running at once can go over the rate between them, and the ones after
+them make up for it; a probe limit keeps that in check.
+
+
+USAGE:
+    import Devices
+    devices = Devices.Scheduler(["/mnt/raid", "/mnt/ltfs"], concurrency=4, rate=100 << 20)
+
+    with devices.slot("/mnt/ltfs/A001/A001C002.mov"):
+        probe("/mnt/ltfs/A001/A001C002.mov")    # waits for a free slot on the tape first
+"""
+
+# Standard python libraries
+import os
+import time
+import threading
+import multiprocessing
+
+
+MOUNTS = "/proc/mounts"
+THREAD_IO = "/proc/thread-self/io"
+
+DIRECTORY_CACHE_SIZE = 4096 # directories whose device is remembered at once
+
+
+def readMounts(filename=MOUNTS):
+    "Returns the mount points listed in filename (/proc/mounts), or [] if it can't be read"
+
+    try:
+        with open(filename) as f:
+            lines = f.readlines()
+    except IOError:
+        return []
+
+    # spaces, tabs, etc. in mount points are written as octal escapes, e.g. \040
+    return [line.split()[1].decode("string_escape") for line in lines if len(line.split()) > 1]
+
+def threadBytesRead():
+    "Returns the number of bytes the calling thread has read so far, or None if that isn't available"
+
+    try:
+        with open(THREAD_IO) as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+
+    return None
+
+
+class Device:
+    "The limits for one device: probes at once (0 for no limit), and bytes a second (0 for no limit)"
+
+    def __init__(self, name, concurrency=0, rate=0):
+        self.name  = name
+        self.rate  = rate
+        self.slots = multiprocessing.BoundedSemaphore(concurrency) if concurrency > 0 else None
+
+        # the time the bytes read so far will have been paid off, at rate
+        self.lock = multiprocessing.Lock()
+        self.due  = multiprocessing.Value('d', 0.0, lock=False)
+
+    def wait(self):
+        "Sleeps until the bytes read on the device so far have been paid off"
+
+        with self.lock:
+            delay = self.due.value - time.time()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def charge(self, nbytes):
+        "Adds nbytes to what's been read on the device"
+
+        with self.lock:
+            self.due.value = max(self.due.value, time.time()) + float(nbytes) / self.rate
+
+
+class Slot(object):
+    "A 'with' block that runs a probe on a device, within its limits"
+
+    __slots__ = ("device", "start")
+
+    def __init__(self, device):
+        self.device = device
+
+    def __enter__(self):
+        device = self.device
+
+        if device.slots is not None:
+            device.slots.acquire()
+
+        # a probe can only be charged for its reads once it's done, so each one waits for the ones before
+        if device.rate:
+            device.wait()
+
+        self.start = threadBytesRead() if device.rate else None
+        return self
+
+    def __exit__(self, *exc):
+        device = self.device
+
+        if device.slots is not None:
+            device.slots.release()
+
+        if self.start is not None:
+            end = threadBytesRead()
+
+            if end is not None:
+                device.charge(end - self.start)
+
+
+class NullSlot(object):
+    "Stands in for a Slot when there are no limits"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SLOT = NullSlot()
+
+
+class Scheduler:
+    "Hands out slots on each device of a scan, limited to concurrency probes at once and rate bytes a second"
+
+    def __init__(self, rootpaths=(), concurrency=0, rate=0):
+        self.concurrency = max(0, int(concurrency))
+        self.rate        = max(0, rate) if threadBytesRead() is not None else 0
+        self.enabled     = self.concurrency > 0 or self.rate > 0
+
+        self.lock        = threading.Lock()
+        self.devices     = {} # st_dev -> Device
+        self.directories = {} # directory -> its Device
+
+        if not self.enabled:
+            return
+
+        # the root paths, and anything mounted under them
+        mounts = readMounts()
+
+        for rootpath in rootpaths:
+            prefix = os.path.join(rootpath, "")
+            self.add(rootpath)
+
+            for mount in mounts:
+                if mount.startswith(prefix):
+                    self.add(mount)
+
+    def add(self, path):
+        "Sets up the limits for the device path is on, if they aren't already. Returns its Device, or None."
+
+        try:
+            dev = os.stat(path).st_dev
+        except OSError:
+            return None
+
+        with self.lock:
+            if dev not in self.devices:
+                self.devices[dev] = Device(path, self.concurrency, self.rate)
+
+            return self.devices[dev]
+
+    def device(self, path):
+        "Returns the Device path (a file) is on, or None if it can't be found"
+
+        directory = os.path.dirname(path)
+
+        with self.lock:
+            device = self.directories.get(directory)
+
+        if device is None:
+            device = self.add(directory)
+
+            with self.lock:
+                if len(self.directories) >= DIRECTORY_CACHE_SIZE:
+                    self.directories.clear()
+
+                self.directories[directory] = device
+
+        return device
+
+    def slot(self, path):
+        "Returns a context manager that holds a slot on the device path is on, for the length of its block"
+
+        if not self.enabled:
+            return NULL_SLOT
+
+        device = self.device(path)
+
+        if device is None:
+            return NULL_SLOT
+
+        return Slot(device)
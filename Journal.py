@@ -0,0 +1,99 @@
+"""
+Journal
+
+Records each directory as it's finished during a scan, so a scan that stops
+part way through (a lost mount, a crash, Ctrl-C, etc.) can be resumed
+instead of started again. A file its parser fails on is reported and left
+out, rather than stopping the scan, so a resumed scan doesn't fail on it
+again.
+
+The journal sits alongside the CSV (the CSV's name + ".journal"). It has a
+line for each finished directory, giving the number of rows that were
+written for it and the size of the CSV once they had been. It's written
+after the rows have been flushed to the CSV, so on resuming, the CSV can be
+cut back to the last size in the journal, getting rid of anything from a
+directory that didn't finish, and carried on from there.
+
+The journal is deleted once the scan has finished.
+
+
+USAGE:
+    import Journal
+    journal = Journal.Journal("/project/metadata.csv")
+
+    journal.load()                              # when resuming
+    if directory in journal.completed:
+        rows = journal.completed[directory]     # skip it
+
+    journal.open()
+    journal.record(directory, rows, csvfile.tell())
+    journal.close()
+
+    journal.remove()                            # once the scan has finished
+"""
+
+# Standard python libraries
+import os
+import json
+
+
+JOURNAL_EXTENSION = ".journal"
+
+
+class Journal:
+    "A log of the directories finished so far in a scan writing to csvfile"
+
+    def __init__(self, csvfile):
+        self.filename  = csvfile + JOURNAL_EXTENSION
+        self.file      = None
+        self.completed = {} # directory -> number of rows written for it
+        self.offset    = 0  # size of the CSV after the last finished directory
+        self.rows      = 0  # total rows written by the finished directories
+
+    def load(self):
+        "Reads the directories finished by an earlier run, if there's a journal. Returns the number of them."
+
+        try:
+            f = open(self.filename, "rb")
+        except IOError:
+            return 0
+
+        with f:
+            for line in f:
+                try:
+                    # paths are byte strings, which go through json losslessly as latin-1
+                    directory, rows, offset = json.loads(line, encoding="latin-1")
+                except ValueError:
+                    break # the last line may be cut short, if the run died while writing it
+
+                directory = directory.encode("latin-1")
+
+                self.rows  += rows - self.completed.get(directory, 0)
+                self.completed[directory] = rows
+                self.offset = offset
+
+        return len(self.completed)
+
+    def open(self):
+        "Opens the journal for adding to. Anything already in it is kept."
+
+        self.file = open(self.filename, "ab")
+
+    def record(self, directory, rows, offset):
+        "Records that directory is finished, with rows written for it, leaving the CSV offset bytes long"
+
+        self.file.write(json.dumps([directory, rows, offset], encoding="latin-1") + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        "Closes and deletes the journal, once the scan has finished"
+
+        self.close()
+
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
@@ -0,0 +1,301 @@
+"""
+Lookup
+
+Answers "which clip covers tape A012 at 14:03:22:10?" from a finished index,
+for conforming EDLs against it.
+
+The index's rows are grouped by tapename (case-insensitively), and each tape's
+clips are kept as intervals of frame counts (source_in up to, but not
+including, source_out) in arrays sorted by source_in, along with the highest
+source_out so far at each position. A lookup is a binary search for the last
+clip starting at or before the frame, and then a step back through any
+earlier clips that still reach past it, which is O(log n) unless the clips
+overlap. Clips on the same tape at different frame rates, or in drop-frame
+and non-drop-frame timecode, are kept apart, since the same timecode is a
+different frame count in each. A query's timecode is counted the same way as
+the clips it's being compared with, whichever separator it's written with
+(EDLs often write drop-frame timecode with colons).
+
+Building the lookup means reading the whole index, so it's saved alongside
+it (the index's name + ".lookup"), and loaded from there next time, as long
+as the index hasn't changed since. A saved lookup from another version is
+built again from its index.
+
+Queries can come from CMX3600-style EDLs (the source in of each event is
+looked up), or from plain lists of tape and timecode pairs, one per line,
+separated by spaces or a comma.
+
+
+USAGE:
+    import Lookup
+    lookup = Lookup.load("/project/metadata.csv")
+
+    for clip in lookup.find("A012", "14:03:22:10"):
+        print clip["filepath"], clip["source_in"], clip["offset"]
+
+    for label, tape, timecode in Lookup.readQueries("/project/reel1.edl"):
+        ...
+"""
+
+# Standard python libraries
+import os
+import re
+import csv
+import json
+import array
+import bisect
+import cPickle
+
+# Custom dependencies
+import Timecode
+
+
+LOOKUP_EXTENSION = ".lookup"
+LOOKUP_VERSION   = 2
+
+# rows with no framerate (ARRIRAW, and DPX/EXR sequences whose headers don't say) were
+# counted at this by the indexer, so they're looked up at it too
+DEFAULT_FRAMERATE = "23.976"
+
+# the fields kept for each clip, from the index
+CLIP_FIELDS = ("tapename", "source_in", "source_out", "filepath", "framerate")
+
+TC = r'(\d{1,2}:\d{2}:\d{2}[:;.]\d{2})'
+
+# event number, reel, track, transition (with a duration for dissolves, wipes, etc.), source in/out, record in/out
+EDL_EVENT = re.compile(r'^\s*(\d+)\s+(\S+)\s+(\S+)\s+(\S+)(?:\s+\d+)?\s+%s\s+%s\s+%s\s+%s' % (TC, TC, TC, TC))
+
+# a tape and a timecode, separated by spaces or a comma
+PAIR = re.compile(r'^\s*"?(.+?)"?\s*[,\s]\s*"?%s"?\s*$' % TC)
+
+
+class Intervals:
+    "The clips on one tape at one frame rate, as sorted intervals of frame counts"
+
+    def __init__(self, fps, dropFrame):
+        self.fps       = fps
+        self.dropFrame = dropFrame
+        self.wraps     = False            # True if any clip runs past midnight
+        self.starts    = array.array('l') # source_in of each clip, sorted
+        self.ends      = array.array('l') # source_out of each clip (exclusive)
+        self.maxEnds   = array.array('l') # the highest of ends[:n + 1]
+        self.clips     = array.array('l') # index of each clip in Lookup.clips
+
+    def build(self, intervals):
+        "Fills the arrays from a list of (start, end, clip index)"
+
+        intervals.sort()
+
+        highest = None
+
+        for start, end, clip in intervals:
+            highest = end if highest is None else max(highest, end)
+
+            self.starts.append(start)
+            self.ends.append(end)
+            self.maxEnds.append(highest)
+            self.clips.append(clip)
+
+    def find(self, frame):
+        "Returns [(clip index, frames into the clip)] for each clip covering frame"
+
+        found = []
+        n = bisect.bisect_right(self.starts, frame) - 1
+
+        # step back through the clips that start earlier, for as long as any of them could still cover frame
+        while n >= 0 and self.maxEnds[n] > frame:
+            if self.ends[n] > frame:
+                found.append((self.clips[n], frame - self.starts[n]))
+            n -= 1
+
+        return found
+
+    # arrays pickle as lists in python 2, so store them as strings instead
+    def __getstate__(self):
+        state = dict(self.__dict__)
+
+        for name in ("starts", "ends", "maxEnds", "clips"):
+            state[name] = state[name].tostring()
+
+        return state
+
+    def __setstate__(self, state):
+        for name in ("starts", "ends", "maxEnds", "clips"):
+            a = array.array('l')
+            a.fromstring(state[name])
+            state[name] = a
+
+        self.__dict__.update(state)
+
+
+class Lookup:
+    "Finds the clips in an index covering a tape and timecode"
+
+    def __init__(self):
+        self.clips   = [] # a tuple of CLIP_FIELDS for each clip
+        self.tapes   = {} # tapename (uppercase) -> [Intervals], one for each frame rate and drop-frame or not
+        self.skipped = 0  # rows that couldn't be looked up: no tapename, or no valid source in and out
+
+    def build(self, rows):
+        "Builds the lookup from the rows of an index (dicts with at least CLIP_FIELDS)"
+
+        pending = {} # (tapename, fps, drop-frame) -> [(start, end, clip index)]
+
+        for row in rows:
+            fps = Timecode.nominalRate(row.get("framerate") or DEFAULT_FRAMERATE)
+            tape = (row.get("tapename") or "").strip().upper()
+
+            if fps is None or not tape:
+                self.skipped += 1
+                continue
+
+            source_in = (row.get("source_in") or "").strip()
+            dropFrame = Timecode.isDropFrame(source_in)
+
+            start = Timecode.toFrames(source_in, fps, dropFrame)
+            end = Timecode.toFrames(row.get("source_out") or "", fps, dropFrame)
+
+            if start is None or end is None:
+                self.skipped += 1
+                continue
+
+            if end <= start:
+                end += Timecode.framesPerDay(fps, dropFrame) # runs past midnight
+
+            pending.setdefault((tape, fps, dropFrame), []).append((start, end, len(self.clips)))
+            self.clips.append(tuple(row.get(f, "") for f in CLIP_FIELDS))
+
+        for (tape, fps, dropFrame), intervals in sorted(pending.items()):
+            day = Timecode.framesPerDay(fps, dropFrame)
+
+            tree = Intervals(fps, dropFrame)
+            tree.wraps = any(end > day for start, end, clip in intervals)
+            tree.build(intervals)
+
+            self.tapes.setdefault(tape, []).append(tree)
+
+        return self
+
+    def find(self, tape, timecode):
+        "Returns a dict (CLIP_FIELDS, plus 'offset': frames into the clip) for each clip covering tape at timecode"
+
+        results = []
+
+        for tree in self.tapes.get(tape.strip().upper(), []):
+            frame = Timecode.toFrames(timecode, tree.fps, tree.dropFrame)
+
+            if frame is None:
+                continue
+
+            found = tree.find(frame)
+
+            if tree.wraps:
+                found += tree.find(frame + Timecode.framesPerDay(tree.fps, tree.dropFrame))
+
+            for clip, offset in found:
+                result = dict(zip(CLIP_FIELDS, self.clips[clip]))
+                result["offset"] = offset
+                results.append(result)
+
+        return results
+
+    def save(self, filename, source=None):
+        "Saves the lookup to filename. source is the (size, mtime) of the index it was built from."
+
+        with open(filename, "wb") as f:
+            cPickle.dump({"version": LOOKUP_VERSION, "source": source, "lookup": self}, f, 2)
+
+
+def readRows(index):
+    "Yields the rows of an index: a CSV, or a JSON Lines file (.jsonl or .json)"
+
+    with open(index, "rb") as f:
+        if os.path.splitext(index)[1].lower() in (".jsonl", ".json"):
+            for line in f:
+                if line.strip():
+                    yield dict((k.encode("utf-8"), v.encode("utf-8")) for k, v in json.loads(line).iteritems())
+        else:
+            for row in csv.DictReader(f):
+                yield row
+
+def sourceKey(index):
+    "Returns the (size, mtime) of an index, to tell whether a saved lookup is out of date"
+
+    st = os.stat(index)
+    return st.st_size, st.st_mtime
+
+def readSaved(filename):
+    "Returns what Lookup.save wrote to filename, or None if it's missing, isn't a lookup, or is from another version"
+
+    try:
+        with open(filename, "rb") as f:
+            saved = cPickle.load(f)
+    except (IOError, EOFError, cPickle.UnpicklingError, AttributeError, ImportError, IndexError, ValueError):
+        return None
+
+    if not isinstance(saved, dict) or saved.get("version") != LOOKUP_VERSION:
+        return None
+
+    return saved
+
+def load(index, save=True):
+    """
+    Returns a Lookup for index, which is either an index (a CSV or JSON Lines file), or a
+    saved lookup. For an index, the lookup saved alongside it is used if it's up to date;
+    otherwise the lookup is built from the index, and (if save is True) saved for next time.
+    A saved lookup from another version is built again from its index, if that's still
+    there, or raises ValueError if it isn't.
+    """
+
+    if index.endswith(LOOKUP_EXTENSION):
+        saved = readSaved(index)
+
+        if saved is not None:
+            return saved["lookup"]
+
+        index = index[:-len(LOOKUP_EXTENSION)]
+
+        if not os.path.exists(index):
+            raise ValueError("%s can't be read by this version, and there's no %s to build it again from" %
+                             (index + LOOKUP_EXTENSION, index))
+
+    filename = index + LOOKUP_EXTENSION
+    source = sourceKey(index)
+    saved = readSaved(filename)
+
+    if saved is not None and saved.get("source") == source:
+        return saved["lookup"]
+
+    lookup = Lookup().build(readRows(index))
+
+    if save:
+        try:
+            lookup.save(filename, source)
+        except IOError:
+            pass # it'll just be built again next time
+
+    return lookup
+
+
+def readQueries(filename):
+    """
+    Yields (label, tape, timecode) for each query in filename: the source in of each event
+    of an EDL, or each tape and timecode pair in a plain list. label is the event number
+    for an EDL, or the line number.
+    """
+
+    with open(filename, "rb") as f:
+        for n, line in enumerate(f, 1):
+            event = EDL_EVENT.match(line)
+
+            if event is not None:
+                yield event.group(1), event.group(2), event.group(5)
+                continue
+
+            if line.startswith("#"):
+                continue
+
+            pair = PAIR.match(line)
+
+            if pair is not None:
+                yield str(n), pair.group(1), pair.group(2)
@@ -0,0 +1,130 @@
+"""
+Progress
+
+Reports the progress of a run on a single status line, instead of printing
+every directory and file. Counts are added up as directories finish, and
+the line is redrawn at most every 'interval' seconds, however quickly they
+come in. That keeps the terminal from becoming the bottleneck on trees with
+millions of files.
+
+The line shows directories, files and media found so far, throughput in
+files/s and MB/s, and an estimate of the time remaining. The estimate is
+based on the directories that have been found but not yet processed, so
+it grows as the walk discovers more of the tree.
+
+On a terminal the line is redrawn in place. Otherwise (e.g. when the output
+is going to a log file) a new line is written, less often.
+
+
+USAGE:
+    import Progress
+    progress = Progress.Progress()
+
+    progress.queued(1)                                  # a directory was found
+    progress.update(directories=1, files=120, media=4, nbytes=1048576)
+
+    progress.finish()
+"""
+
+# Standard python libraries
+import sys
+import time
+import threading
+
+
+DEFAULT_INTERVAL = 0.5  # seconds between redraws on a terminal
+LOG_INTERVAL     = 30   # seconds between lines when the output isn't a terminal
+
+
+def formatDuration(seconds):
+    "Formats seconds as h:mm:ss"
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+
+class Progress:
+    "Adds up the progress of a run, and reports it at a fixed rate. Safe to share between threads."
+
+    def __init__(self, stream=sys.stderr, interval=None):
+        self.stream = stream
+        self.tty = hasattr(stream, "isatty") and stream.isatty()
+
+        if interval is None:
+            interval = DEFAULT_INTERVAL if self.tty else LOG_INTERVAL
+
+        self.interval = interval
+        self.lock = threading.Lock()
+
+        self.started  = time.time()
+        self.drawn    = 0 # when the line was last drawn
+        self.width    = 0 # length of the last line drawn, for clearing it
+
+        self.found       = 0 # directories found so far
+        self.directories = 0 # directories processed
+        self.files       = 0
+        self.media       = 0 # files and sequences with metadata
+        self.bytes       = 0
+
+    def queued(self, n):
+        "Records that n more directories have been found, and are waiting to be processed"
+
+        with self.lock:
+            self.found += n
+
+    def update(self, directories=0, files=0, media=0, nbytes=0):
+        "Adds to the counts, and redraws the line if it's due"
+
+        with self.lock:
+            self.directories += directories
+            self.files       += files
+            self.media       += media
+            self.bytes       += nbytes
+
+            now = time.time()
+
+            if now - self.drawn >= self.interval:
+                self.draw(now)
+
+    def line(self, now):
+        "Returns the status line"
+
+        elapsed = max(now - self.started, 1e-6)
+
+        remaining = self.found - self.directories
+
+        if self.directories and remaining > 0:
+            eta = formatDuration(remaining * elapsed / self.directories)
+        elif remaining > 0:
+            eta = "--"
+        else:
+            eta = formatDuration(0)
+
+        return "%d dirs (%d queued)  %d files  %d media  %.1f files/s  %.1f MB/s  elapsed %s  ETA %s" % \
+               (self.directories, remaining, self.files, self.media,
+                self.files / elapsed, self.bytes / elapsed / 1048576, formatDuration(elapsed), eta)
+
+    def draw(self, now):
+        line = " " + self.line(now)
+
+        if self.tty:
+            # overwrite the last line, padding out anything left over from it
+            self.stream.write("\r%s%s" % (line, " " * max(0, self.width - len(line))))
+            self.width = len(line)
+        else:
+            self.stream.write(line + "\n")
+
+        self.stream.flush()
+        self.drawn = now
+
+    def finish(self):
+        "Draws the final counts, and leaves the line behind"
+
+        with self.lock:
+            self.draw(time.time())
+
+            if self.tty:
+                self.stream.write("\n")
+                self.stream.flush()
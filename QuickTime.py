@@ -0,0 +1,294 @@
+"""
+QuickTime
+
+Reads the framerate, duration and starting timecode of a QuickTime (MOV) or
+ISO base media (MP4) file straight from its boxes, without MediaInfo.
+
+The top-level boxes are stepped over (seeking past the media data, however
+big it is) until the moov box is found, and only that is read: the video
+track's mdhd (timescale) and stts (frame durations), and the timecode track's
+tmcd sample description and first sample, which is a single 4 byte frame
+number in the media data.
+
+Anything the reader doesn't understand (fragmented files, files without a
+video track, an AVI, etc.) returns None, so the caller can fall back on
+MediaInfo.
+
+
+USAGE:
+    import QuickTime
+    info = QuickTime.probe("/path/to/A001C002.mov")
+
+    # info will contain something like this, or be None:
+    {'framerate': '23.976', 'frames': 1440, 'timecode': '01:00:00:00'}
+
+    # 'timecode' is None if there's no timecode track, and written with a ';' if the
+    # track says it's drop-frame. the framerate is formatted the same way MediaInfo formats it.
+"""
+
+# Standard python libraries
+import os
+import struct
+
+# Custom dependencies
+import Stats
+import Timecode
+
+
+MAX_TOP_LEVEL = 64          # top-level boxes to step over looking for moov, before giving up
+MAX_MOOV      = 64 << 20    # largest moov box we're willing to read
+
+# the first box of a QuickTime or MP4 file is one of these
+TOP_LEVEL_TYPES = frozenset(['ftyp', 'moov', 'mdat', 'wide', 'free', 'skip', 'pnot', 'uuid'])
+
+TMCD_DROP_FRAME = 0x0001    # tmcd flags
+
+
+def boxes(data, start=0, end=None):
+    "Iterates over the boxes in data[start:end], yielding (type, payload start, end) for each"
+
+    if end is None:
+        end = len(data)
+
+    pos = start
+
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header = 8
+
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos # runs to the end of its parent
+
+        if size < header or pos + size > end:
+            return # corrupt, or cut short
+
+        yield kind, pos + header, pos + size
+        pos += size
+
+def find(data, path, start=0, end=None):
+    "Returns (payload start, end) of the first box down path (e.g. ['mdia', 'hdlr']), or None"
+
+    for kind, payload, boxEnd in boxes(data, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return payload, boxEnd
+
+            return find(data, path[1:], payload, boxEnd)
+
+    return None
+
+
+def readMoov(f, t):
+    "Steps over the top-level boxes of f to find moov, and returns its contents, or None"
+
+    f.seek(0, os.SEEK_END)
+    fileSize = f.tell()
+    pos = 0
+
+    for n in xrange(MAX_TOP_LEVEL):
+        if pos + 8 > fileSize:
+            return None
+
+        f.seek(pos)
+        header = f.read(16)
+        t.bytes += len(header)
+
+        if len(header) < 8:
+            return None
+
+        size, kind = struct.unpack_from('>I4s', header)
+        headerSize = 8
+
+        if n == 0 and kind not in TOP_LEVEL_TYPES:
+            return None # not a QuickTime/MP4 file
+
+        if size == 1:
+            if len(header) < 16:
+                return None
+            size = struct.unpack_from('>Q', header, 8)[0]
+            headerSize = 16
+        elif size == 0:
+            size = fileSize - pos
+
+        if size < headerSize:
+            return None
+
+        if kind == 'moov':
+            if size > MAX_MOOV:
+                return None
+
+            f.seek(pos + headerSize)
+            data = f.read(size - headerSize)
+            t.bytes += len(data)
+
+            return data if len(data) == size - headerSize else None
+
+        pos += size
+
+    return None
+
+
+def readTrack(moov, start, end):
+    "Returns a dict of what we need from a trak box: handler, timescale, duration and sample table boxes"
+
+    track = {}
+
+    mdia = find(moov, ['mdia'], start, end)
+
+    if mdia is None:
+        return track
+
+    hdlr = find(moov, ['hdlr'], *mdia)
+
+    if hdlr is not None and hdlr[1] - hdlr[0] >= 12:
+        track['handler'] = moov[hdlr[0] + 8:hdlr[0] + 12]
+
+    mdhd = find(moov, ['mdhd'], *mdia)
+
+    if mdhd is not None:
+        if ord(moov[mdhd[0]]) == 1 and mdhd[1] - mdhd[0] >= 32:
+            track['timescale'], track['duration'] = struct.unpack_from('>IQ', moov, mdhd[0] + 20)
+        elif mdhd[1] - mdhd[0] >= 20:
+            track['timescale'], track['duration'] = struct.unpack_from('>II', moov, mdhd[0] + 12)
+
+    stbl = find(moov, ['minf', 'stbl'], *mdia)
+
+    if stbl is not None:
+        for kind in ('stsd', 'stts', 'stco', 'co64'):
+            box = find(moov, [kind], *stbl)
+
+            if box is not None:
+                track[kind] = box
+
+    return track
+
+def sampleTimes(moov, stts):
+    "Returns (number of samples, total duration) from an stts box"
+
+    count = struct.unpack_from('>I', moov, stts[0] + 4)[0]
+
+    if stts[0] + 8 + count * 8 > stts[1]:
+        return 0, 0
+
+    samples = 0
+    total = 0
+
+    for n in xrange(count):
+        entrySamples, delta = struct.unpack_from('>II', moov, stts[0] + 8 + n * 8)
+        samples += entrySamples
+        total += entrySamples * delta
+
+    return samples, total
+
+def firstChunkOffset(moov, track):
+    "Returns the file offset of a track's first chunk, or None"
+
+    if 'stco' in track:
+        box, fmt, size = track['stco'], '>I', 4
+    elif 'co64' in track:
+        box, fmt, size = track['co64'], '>Q', 8
+    else:
+        return None
+
+    count = struct.unpack_from('>I', moov, box[0] + 4)[0]
+
+    if count == 0 or box[0] + 8 + size > box[1]:
+        return None
+
+    return struct.unpack_from(fmt, moov, box[0] + 8)[0]
+
+
+def readTimecode(f, t, moov, track, frames, rate):
+    """
+    Returns the starting timecode from a tmcd track, or None if it can't be read.
+    Returns False if the track's duration doesn't match the video's frames, at the video's rate.
+    """
+
+    stsd = track.get('stsd')
+
+    # the sample description: U32 entry count, then the first entry, which for
+    # tmcd is the usual 16 bytes, then reserved, flags, timescale, frame duration
+    # and number of frames
+    if stsd is None or stsd[1] - stsd[0] < 41 or moov[stsd[0] + 12:stsd[0] + 16] != 'tmcd':
+        return None
+
+    flags = struct.unpack_from('>I', moov, stsd[0] + 28)[0]
+    fps = ord(moov[stsd[0] + 40]) # frames a second the timecode counts, e.g. 30 for 29.97
+
+    if fps == 0:
+        return None
+
+    # the timecode track should last as long as the video (in frames of the video's rate)
+    if track.get('timescale') and 'duration' in track:
+        seconds = float(track['duration']) / track['timescale']
+
+        if int(round(seconds * rate)) != frames:
+            return False
+
+    offset = firstChunkOffset(moov, track)
+
+    if offset is None:
+        return None
+
+    f.seek(offset)
+    sample = f.read(4)
+    t.bytes += len(sample)
+
+    if len(sample) < 4:
+        return None
+
+    # drop-frame is written with a ';', so the source out is counted the same way
+    return Timecode.fromFrames(struct.unpack('>I', sample)[0], fps, bool(flags & TMCD_DROP_FRAME))
+
+
+def probe(path):
+    try:
+        f = open(path, 'rb')
+    except (IOError, OSError):
+        return None
+
+    with f, Stats.timer('quicktime.probe') as t:
+        try:
+            moov = readMoov(f, t)
+
+            if moov is None:
+                return None
+
+            tracks = [readTrack(moov, start, end) for kind, start, end in boxes(moov) if kind == 'trak']
+
+            video = [tr for tr in tracks if tr.get('handler') == 'vide' and 'stts' in tr and tr.get('timescale')]
+
+            if not video:
+                return None
+
+            video = video[0]
+            frames, total = sampleTimes(moov, video['stts'])
+
+            if frames == 0 or total == 0:
+                return None # e.g. a fragmented file, whose samples are all in moof boxes
+
+            rate = float(frames) * video['timescale'] / total
+
+            info = {'framerate': '%.3f' % rate,
+                    'frames':    frames,
+                    'timecode':  None}
+
+            for track in tracks:
+                if track.get('handler') == 'tmcd':
+                    timecode = readTimecode(f, t, moov, track, frames, rate)
+
+                    if timecode is False:
+                        return None # leave it to MediaInfo to sort out
+
+                    info['timecode'] = timecode
+                    break
+
+            return info
+
+        except (IOError, OSError, struct.error):
+            return None
@@ -0,0 +1,157 @@
+"""
+REDline
+
+Runs RED's REDline command line tool to dump the metadata of R3D clips.
+
+REDline is run directly rather than through a shell. A Runner limits how
+many REDline processes can run at once, and kills any that take longer
+than its timeout. The limit is a multiprocessing semaphore, so it holds
+across the worker processes too, as long as the Runner is created before
+they're started.
+
+Any program that takes the same arguments and prints the same CSV can
+stand in for REDline (set the REDLINE environment variable, or pass a
+binary to Runner). This makes it possible to test without the RED tools
+installed.
+
+
+USAGE:
+    import REDline
+    runner = REDline.Runner(binary="REDline", concurrency=4, timeout=60)
+
+    meta = runner.printMeta("/path/to/A001_C002_1116QL_001.R3D")
+
+    # meta will contain something like this, or None if REDline failed:
+    {'Clip Name': 'A001_C002_1116QL', 'Abs TC': '01:00:00:00', ...}
+"""
+
+# Standard python libraries
+import os
+import sys
+import csv
+import errno
+import signal
+import subprocess
+import threading
+import multiprocessing
+from cStringIO import StringIO
+
+# Custom dependencies
+import Stats
+
+
+DEFAULT_BINARY      = os.environ.get("REDLINE", "REDline")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT     = 120 # seconds
+
+
+def parseMeta(output):
+    "Parses the output of --printMeta 3 (a header row and a value row) into a dict. Returns None if it's incomplete."
+
+    # read just the two rows we need, straight from the output
+    rows = csv.reader(StringIO(output.strip()))
+
+    headers = next(rows, None)
+    values = next(rows, None)
+
+    if headers is None or values is None:
+        return None
+
+    return dict(zip(headers, values))
+
+
+def killProcess(p):
+    "Kills a process that's taken too long, along with anything it started. Used by the Runner's timer."
+
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except OSError:
+        pass # it's already finished
+
+
+def threadMap(function, items, threads):
+    "Like map(), but runs function on up to 'threads' items at once. Exceptions are re-raised."
+
+    items = list(items)
+    results = [None] * len(items)
+
+    if threads <= 1 or len(items) <= 1:
+        return [function(i) for i in items]
+
+    lock = threading.Lock()
+    queue = enumerate(items)
+    errors = []
+
+    def worker():
+        while True:
+            with lock:
+                if errors:
+                    return
+                n, item = next(queue, (None, None))
+
+            if n is None:
+                return
+
+            try:
+                results[n] = function(item)
+            except Exception:
+                with lock:
+                    errors.append(sys.exc_info())
+
+    workers = [threading.Thread(target=worker) for n in xrange(min(threads, len(items)))]
+
+    for t in workers:
+        t.start()
+
+    for t in workers:
+        t.join()
+
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+    return results
+
+
+class Runner:
+    "Runs REDline, a limited number of processes at a time"
+
+    def __init__(self, binary=DEFAULT_BINARY, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.binary = binary
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+
+        self.slots = multiprocessing.BoundedSemaphore(self.concurrency)
+        self.missing = False # set once the binary turns out not to be there, so it isn't tried again
+
+    def printMeta(self, filename):
+        "Returns the metadata REDline prints for filename as a dict, or None if REDline failed or timed out"
+
+        if self.missing:
+            return None
+
+        with self.slots, Stats.timer("redline.printMeta"):
+            try:
+                # REDline gets its own process group, so that if it's a wrapper script,
+                # a timeout kills the real thing as well
+                p = subprocess.Popen([self.binary, "-i", filename, "--printMeta", "3"],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     preexec_fn=os.setsid)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    self.missing = True # REDline isn't installed
+
+                return None # or can't be run
+
+            timer = threading.Timer(self.timeout, killProcess, [p])
+            timer.start()
+
+            try:
+                # this will block until the output is ready, or the timer kills REDline
+                output = p.communicate()[0]
+            finally:
+                timer.cancel()
+
+        if p.returncode < 0:
+            return None # killed by the timer
+
+        return parseMeta(output)
@@ -0,0 +1,223 @@
+"""
+Shard
+
+Splits a scan across several machines, with no coordinator: each one is
+given a shard spec such as "3/16" (shard 3 of 16), and works out for itself
+which part of the root paths is its own.
+
+The top-level directories of each root path (the ones directly under it)
+are shared out by a hash of their names, so every node agrees on who owns
+what, and adding a directory doesn't move any of the others. The files
+directly in the root paths themselves belong to shard 1.
+
+Each shard writes its own partial CSV, along with a manifest (the CSV's
+name + ".shard") listing the blocks of rows it wrote for each top-level
+directory. merge() uses the manifests to put the partials back together
+into one CSV, in the same order as a run on a single node.
+
+
+USAGE:
+    import Shard
+
+    shard = Shard.Shard(*Shard.parseSpec("3/16"))
+
+    for directory, result in Traversal.walk(rootpaths, process, include=shard.include):
+        ...
+
+    manifest = Shard.Manifest("/farm/part03.csv", shard, rootpaths)
+    manifest.add(directory, rows)       # for each directory, in walk order
+    manifest.write()
+
+    # once every shard is done
+    Shard.merge(["/farm/part01.csv", ..., "/farm/part16.csv"], "/project/metadata.csv", header)
+"""
+
+# Standard python libraries
+import os
+import csv
+import json
+import zlib
+
+
+MANIFEST_EXTENSION = ".shard"
+
+
+def parseSpec(spec):
+    "Parses a shard spec like '3/16' into (3, 16). Raises ValueError if it isn't valid."
+
+    index, sep, count = spec.partition("/")
+
+    try:
+        index = int(index)
+        count = int(count)
+    except ValueError:
+        raise ValueError("a shard should be given as N/COUNT, e.g. 3/16, not '%s'" % spec)
+
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("shard %d/%d doesn't exist: shards are numbered from 1 to the count" % (index, count))
+
+    return index, count
+
+
+def blockKey(rootpaths, directory):
+    """
+    Returns (root index, top-level directory name) for a directory under one of rootpaths,
+    or (root index, "") for a root path itself. Sorting these keys gives the order
+    the blocks come in on a single node. Returns None if directory isn't under any of them.
+    """
+
+    for i, rootpath in enumerate(rootpaths):
+        if directory == rootpath:
+            return i, ""
+
+        prefix = os.path.join(rootpath, "")
+
+        if directory.startswith(prefix):
+            return i, directory[len(prefix):].split(os.sep, 1)[0]
+
+    return None
+
+
+class Shard:
+    "One shard of a scan: shard 'index' (numbered from 1) of 'count'"
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __str__(self):
+        return "%d/%d" % (self.index, self.count)
+
+    def owns(self, name):
+        "Returns True if the top-level directory called name belongs to this shard"
+
+        # crc32 is stable across machines and python versions, unlike hash()
+        return (zlib.crc32(name) & 0xffffffff) % self.count == self.index - 1
+
+    def include(self, directory, depth):
+        """
+        For Traversal.walk: returns True if this shard should process a root path (depth 0),
+        or walk a top-level directory (depth 1)
+        """
+
+        if depth == 0:
+            return self.index == 1
+
+        return self.owns(os.path.basename(directory))
+
+
+class Manifest:
+    "Records which blocks of rows a shard wrote to its partial CSV, for merge()"
+
+    def __init__(self, csvfile, shard, rootpaths):
+        self.filename  = csvfile + MANIFEST_EXTENSION
+        self.shard     = shard
+        self.rootpaths = rootpaths
+        self.blocks    = [] # [root index, top-level directory name, number of rows], in walk order
+
+    def add(self, directory, rows):
+        "Adds the number of rows written for a directory. Directories have to be added in walk order."
+
+        key = blockKey(self.rootpaths, directory)
+
+        if key is None:
+            return
+
+        if self.blocks and tuple(self.blocks[-1][:2]) == key:
+            self.blocks[-1][2] += rows
+        else:
+            self.blocks.append([key[0], key[1], rows])
+
+    def write(self):
+        # paths and names are byte strings, which go through json losslessly as latin-1.
+        # it's written alongside and then moved into place, so it's never left half written
+        with open(self.filename + ".tmp", "w") as f:
+            json.dump({"shard":     self.shard.index,
+                       "shards":    self.shard.count,
+                       "rootpaths": self.rootpaths,
+                       "blocks":    [b for b in self.blocks if b[2] > 0]}, f, indent=4, encoding="latin-1")
+            f.write("\n")
+
+        os.rename(self.filename + ".tmp", self.filename)
+
+
+def readManifest(csvfile):
+    "Returns the manifest for a partial CSV, as written by Manifest.write. Raises IOError or ValueError."
+
+    with open(csvfile + MANIFEST_EXTENSION) as f:
+        manifest = json.load(f, encoding="latin-1")
+
+    # json hands back unicode; paths and names are byte strings everywhere else
+    manifest["rootpaths"] = [p.encode("latin-1") for p in manifest["rootpaths"]]
+    manifest["blocks"] = [(i, name.encode("latin-1"), rows) for i, name, rows in manifest["blocks"]]
+
+    return manifest
+
+
+def merge(partials, output, header):
+    """
+    Combines the partial CSVs written by every shard of a scan into one CSV, output,
+    with the given header row. Rows come out in the same order as a single-node run.
+    Only one row per partial is held in memory at a time. Returns the number of rows written.
+
+    Raises ValueError if the partials don't make up one complete scan.
+    """
+
+    manifests = [readManifest(p) for p in partials]
+
+    if not manifests:
+        raise ValueError("there are no partial CSVs to merge")
+
+    count = manifests[0]["shards"]
+    roots = len(manifests[0]["rootpaths"])
+
+    # the root paths themselves may differ, if the shards ran on machines that mount
+    # the storage in different places. but they have to come in the same order
+    for partial, manifest in zip(partials, manifests):
+        if manifest["shards"] != count or len(manifest["rootpaths"]) != roots:
+            raise ValueError("%s is from a different scan to %s" % (partial, partials[0]))
+
+    shards = sorted(m["shard"] for m in manifests)
+
+    if shards != range(1, count + 1):
+        raise ValueError("expected one partial CSV for each of shards 1 to %d, but got shards %s" %
+                         (count, ", ".join(str(s) for s in shards)))
+
+    # each partial's blocks are in walk order already, so they can be read straight
+    # through while the blocks from all of them are put in order
+    blocks = []
+
+    for n, manifest in enumerate(manifests):
+        for i, name, rows in manifest["blocks"]:
+            blocks.append(((i, name), n, rows))
+
+    blocks.sort()
+
+    readers = [None] * len(partials)
+    files   = []
+    total   = 0
+
+    try:
+        with open(output, "wb") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+
+            for key, n, rows in blocks:
+                if readers[n] is None:
+                    files.append(open(partials[n], "rb"))
+                    readers[n] = csv.reader(files[-1])
+                    next(readers[n]) # the header
+
+                for r in xrange(rows):
+                    writer.writerow(next(readers[n]))
+
+                total += rows
+
+    except StopIteration:
+        raise ValueError("a partial CSV has fewer rows than its manifest says")
+
+    finally:
+        for p in files:
+            p.close()
+
+    return total
@@ -0,0 +1,176 @@
+"""
+Stats
+
+Timers and counters for each stage of a run (listing directories, grouping
+sequences, each metadata handler, timecode math, CSV writing, etc.), so it's
+possible to see where the time goes on a given volume.
+
+Each timer records how many times it ran, how long each run took (reported
+as the total, p50, p99 and max) and, where it makes sense, how many bytes
+were read (or written, for the output). Everything is thread-safe. Worker processes keep their own stats;
+drain() them there and merge() them into the parent's.
+
+Stats are off by default, in which case timer() hands back a shared do-nothing
+timer, and recording costs next to nothing.
+
+
+USAGE:
+    import Stats
+    Stats.enabled = True
+
+    with Stats.timer("headers.read") as t:
+        data = f.read(2048)
+        t.bytes += len(data)
+
+    Stats.count("catalog.hits")
+
+    Stats.write("/project/stats.json", {"files": 1234})
+
+    # the JSON file will contain something like this:
+    {"run": {"files": 1234},
+     "timers": {"headers.read": {"count": 812, "total": 0.41, "p50": 0.0004, "p99": 0.003, "max": 0.01, "bytes": 1662976}, ...},
+     "counters": {"catalog.hits": 730, ...}}
+"""
+
+# Standard python libraries
+import json
+import math
+import time
+import array
+import threading
+
+
+enabled = False
+
+lock      = threading.Lock()
+timings   = {} # name -> array of durations, in seconds
+bytesRead = {} # name -> number of bytes read
+counters  = {} # name -> count
+
+
+class Timer(object):
+    "Times a 'with' block, and records it under name when the block ends"
+
+    __slots__ = ("name", "bytes", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.time() - self.start, self.bytes)
+
+
+class NullTimer(object):
+    "Stands in for a Timer when stats are off"
+
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_TIMER = NullTimer()
+
+
+def timer(name):
+    "Returns a context manager that times its block under name"
+
+    if not enabled:
+        return NULL_TIMER
+
+    return Timer(name)
+
+def record(name, elapsed, nbytes=0):
+    "Records one run of name, which took elapsed seconds and read nbytes"
+
+    with lock:
+        if name not in timings:
+            timings[name] = array.array('d')
+            bytesRead[name] = 0
+
+        timings[name].append(elapsed)
+        bytesRead[name] += nbytes
+
+def count(name, n=1):
+    "Adds n to the counter name"
+
+    if not enabled:
+        return
+
+    with lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def drain():
+    "Returns everything recorded so far, as plain lists and dicts that can be pickled, and starts again from nothing"
+
+    with lock:
+        data = {"timings": dict((k, v.tolist()) for k, v in timings.items()),
+                "bytes": dict(bytesRead),
+                "counters": dict(counters)}
+
+        timings.clear()
+        bytesRead.clear()
+        counters.clear()
+
+    return data
+
+def merge(data):
+    "Adds the stats returned by drain() (e.g. in a worker process) to this process's"
+
+    with lock:
+        for name, durations in data["timings"].items():
+            if name not in timings:
+                timings[name] = array.array('d')
+                bytesRead[name] = 0
+
+            timings[name].extend(durations)
+            bytesRead[name] += data["bytes"].get(name, 0)
+
+        for name, n in data["counters"].items():
+            counters[name] = counters.get(name, 0) + n
+
+
+def percentile(durations, p):
+    "Returns the p'th percentile (nearest rank) of a sorted list of durations"
+
+    if not durations:
+        return 0.0
+
+    rank = int(math.ceil(p / 100.0 * len(durations))) - 1
+    return durations[max(0, min(len(durations) - 1, rank))]
+
+def summary():
+    "Returns a dict of the count, total, p50, p99, max and bytes of every timer, and every counter"
+
+    with lock:
+        report = {}
+
+        for name, durations in timings.items():
+            durations = sorted(durations)
+
+            report[name] = {"count": len(durations),
+                            "total": sum(durations),
+                            "p50":   percentile(durations, 50),
+                            "p99":   percentile(durations, 99),
+                            "max":   durations[-1] if durations else 0.0,
+                            "bytes": bytesRead[name]}
+
+        return {"timers": report, "counters": dict(counters)}
+
+def write(filename, run=None):
+    "Writes the summary() to filename as JSON, along with anything in run (e.g. the total number of files)"
+
+    report = summary()
+    report["run"] = run or {}
+
+    with open(filename, "w") as f:
+        json.dump(report, f, indent=4, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,180 @@
+"""
+Timecode
+
+Converts between SMPTE timecode strings and frame counts, with plain integer
+arithmetic. The metadata handlers use it for their timecode maths (e.g. the
+exclusive source out of a clip is its source in plus its duration), instead
+of making objects for every clip.
+
+A timecode counts whole frames at its nominal rate: 24 for 23.976, 30 for
+29.97, and so on. Drop-frame timecode (written with a ';' or '.' before the
+frames, e.g. 01:00:00;00) skips frame numbers 00 and 01 at the start of
+every minute except every tenth (00-03 at 59.94), so that it keeps up with
+the clock. Frame counts are always actual frames since 00:00:00:00.
+
+Whether a timecode is drop-frame comes from the timecode itself, never from
+the rate: plenty of 29.97 footage carries non-drop timecode. Labels that
+drop-frame skips (e.g. 00:01:00;00) aren't valid drop-frame timecodes.
+
+The Batch versions convert a whole list at once, working out everything
+that depends only on the rate once rather than for each timecode.
+
+
+USAGE:
+    import Timecode
+
+    Timecode.nominalRate("23.976")                      # 24
+    Timecode.toFrames("01:00:00:00", 24)                # 86400
+    Timecode.toFrames("01:00:00;00", 30)                # 107892 (drop-frame)
+    Timecode.fromFrames(86401, 24)                      # "01:00:00:01"
+    Timecode.fromFrames(107892, 30, dropFrame=True)     # "01:00:00;00"
+    Timecode.offset("01:00:00:00", 48, "23.976")        # "01:00:02:00"
+    Timecode.offset("00:00:59;29", 1, "29.97")          # "00:01:00;02" (drop-frame)
+
+    Timecode.fromFramesBatch(xrange(86400, 86500), 24)  # ["01:00:00:00", "01:00:00:01", ...]
+"""
+
+# Standard python libraries
+import re
+
+
+TIMECODE = re.compile(r'^(\d{1,2}):(\d{2}):(\d{2})([:;.])(\d{2,3})$')
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def nominalRate(framerate):
+    "Returns the whole number of frames a second a timecode counts at a framerate (e.g. '23.976' gives 24), or None"
+
+    try:
+        rate = float(framerate)
+    except (TypeError, ValueError):
+        return None
+
+    if rate <= 0:
+        return None
+
+    return int(round(rate))
+
+def isDropFrame(timecode):
+    "Returns True if timecode is written as drop-frame, with a ';' or '.' before the frames"
+
+    match = TIMECODE.match(timecode.strip())
+    return match is not None and match.group(4) in ';.'
+
+
+def toFramesBatch(timecodes, fps, dropFrame=None):
+    """
+    Returns the frame count of each of timecodes ('HH:MM:SS:FF'), counting fps frames a second,
+    with None for any that aren't valid timecodes (including labels that drop-frame skips, if
+    they're counted as drop-frame). dropFrame defaults to what each timecode's separator says.
+    """
+
+    if not fps:
+        return [None] * len(timecodes)
+
+    drop = fps / 15 if fps % 30 == 0 else 0 # frame numbers dropped a minute: 2 at 29.97, 4 at 59.94
+    match = TIMECODE.match
+    results = []
+
+    for timecode in timecodes:
+        m = match(timecode.strip())
+
+        if m is None:
+            results.append(None)
+            continue
+
+        hh, mm, ss, separator, ff = m.groups()
+        hh, mm, ss, ff = int(hh), int(mm), int(ss), int(ff)
+
+        if mm > 59 or ss > 59 or ff >= fps:
+            results.append(None)
+            continue
+
+        frames = ((hh * 60 + mm) * 60 + ss) * fps + ff
+
+        if drop and (separator in ';.' if dropFrame is None else dropFrame):
+            if ss == 0 and ff < drop and mm % 10 != 0:
+                results.append(None) # skipped by drop-frame, so there's no such frame
+                continue
+
+            minutes = hh * 60 + mm
+            frames -= drop * (minutes - minutes / 10)
+
+        results.append(frames)
+
+    return results
+
+def fromFramesBatch(frames, fps, dropFrame=False, separator=None):
+    """
+    Returns the timecode of each of frames, counting fps frames a second. Wraps around at
+    24 hours. The frames are separated with ';' for drop-frame and ':' otherwise, unless
+    separator is given.
+    """
+
+    drop = fps / 15 if dropFrame and fps % 30 == 0 else 0
+
+    if separator is None:
+        separator = ';' if drop else ':'
+
+    template = '%02d:%02d:%02d' + separator + '%02d'
+    perMinute = fps * 60
+    perHour = fps * 3600
+    perDroppedMinute = perMinute - drop
+    perDropped10Minutes = perMinute * 10 - drop * 9
+    results = []
+
+    for n in frames:
+        if drop:
+            # put back the frame numbers that were skipped, then count as usual
+            tens, rest = divmod(n, perDropped10Minutes)
+            n += drop * 9 * tens
+
+            if rest > drop:
+                n += drop * ((rest - drop) / perDroppedMinute)
+
+        results.append(template % (n / perHour % 24, n / perMinute % 60, n / fps % 60, n % fps))
+
+    return results
+
+def toFrames(timecode, fps, dropFrame=None):
+    """
+    Returns the frame count of timecode ('HH:MM:SS:FF'), counting fps frames a second, or None
+    if it isn't a valid timecode. dropFrame defaults to what the timecode's separator says.
+    """
+
+    return toFramesBatch([timecode], fps, dropFrame)[0]
+
+def fromFrames(frames, fps, dropFrame=False, separator=None):
+    "Returns the timecode of a frame count, counting fps frames a second. Wraps around at 24 hours."
+
+    return fromFramesBatch([frames], fps, dropFrame, separator)[0]
+
+def offset(timecode, frames, framerate):
+    """
+    Returns the timecode frames after timecode, at framerate (a string like '23.976'), or None
+    if either isn't valid. It's drop-frame (written with a ';') if timecode is, and non-drop
+    otherwise, whatever the rate.
+    """
+
+    fps = nominalRate(framerate)
+
+    if fps is None:
+        return None
+
+    dropFrame = isDropFrame(timecode)
+    start = toFrames(timecode, fps, dropFrame)
+
+    if start is None:
+        return None
+
+    return fromFrames(start + frames, fps, dropFrame, ';' if dropFrame else ':')
+
+def framesPerDay(fps, dropFrame=False):
+    "Returns the number of frames in 24 hours of timecode"
+
+    if dropFrame and fps % 30 == 0:
+        drop = fps / 15
+        return SECONDS_PER_DAY * fps - drop * (24 * 60 - 24 * 6)
+
+    return SECONDS_PER_DAY * fps
@@ -0,0 +1,303 @@
+"""
+Traversal
+
+Walks one or more directory trees using a pool of worker threads, so that
+several directories can be listed and processed at once. This matters on
+network storage (NFS/SMB), where every listing and stat is a round trip.
+
+Directories are listed with scandir where it's available (os.scandir on
+Python 3.5+, or the scandir backport), and with os.listdir otherwise.
+
+Although directories are processed concurrently, results come back in a
+fixed order: the same top-down order as os.walk, with the subdirectories
+of each directory sorted by name. Workers always pick up the pending
+directory that comes first in that order, so the directory being waited
+on is never stuck behind later work. The number of finished directories
+held back waiting for their turn is capped, so memory stays bounded however
+large the tree is.
+
+The directories can also be limited to a number at once on each device (by
+st_dev), to go with Devices' limits on the probes. Workers then pick up the
+first pending directory on a device that has room, so a slow device (an
+LTFS tape, say) only ties up that many of them, and the rest carry on with
+the other devices instead of queueing up behind it.
+
+
+USAGE:
+    import Traversal
+
+    def process(directory, entries):
+        return CameraMetadata.listDirectory(directory, entries=entries)
+
+    for directory, result in Traversal.walk(["/path/to/r3d", "/path/to/dpx"], process, threads=32):
+        print directory, result
+"""
+
+# Standard python libraries
+import os
+import sys
+import stat
+import heapq
+import threading
+
+# Custom dependencies
+import Stats
+
+# scandir is built in from Python 3.5, and available as a backport before that
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+DEFAULT_THREADS = 8
+DEFAULT_WINDOW  = 256 # finished directories that can be held back, waiting to be yielded in order
+
+
+class DirEntry(object):
+    "A minimal stand-in for scandir's DirEntry, used when scandir isn't available"
+
+    __slots__ = ("name", "path", "_stat", "_lstat")
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat = None
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks is False:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_symlink(self):
+        try:
+            return stat.S_ISLNK(self.stat(False).st_mode)
+        except OSError:
+            return False
+
+
+def scanDirectory(directory):
+    "Returns a list of the entries in directory, sorted by name. Raises OSError if it can't be read."
+
+    with Stats.timer("directories.list"):
+        if scandir is not None:
+            entries = list(scandir(directory))
+        else:
+            entries = [DirEntry(directory, name) for name in os.listdir(directory)]
+
+        entries.sort(key=lambda e: e.name)
+
+    return entries
+
+
+def deviceOf(directory, entry=None):
+    "Returns the st_dev of directory, from entry's (cached) stat result if there is one, or None if it can't be found"
+
+    try:
+        return (entry.stat() if entry is not None else os.stat(directory)).st_dev
+    except OSError:
+        return None
+
+
+def walk(rootpaths, process, threads=DEFAULT_THREADS, window=DEFAULT_WINDOW, queued=None, include=None, deviceJobs=0, device=None):
+    """
+    Generator that walks every directory under rootpaths, calling process(directory, entries)
+    for each one in a pool of worker threads. entries is the sorted list of DirEntry
+    objects for the directory, so process doesn't have to list it again.
+    Yields (directory, result) pairs, in os.walk order (top-down, subdirectories sorted by name).
+
+    Like os.walk, directories that can't be listed are skipped, and symlinks to
+    directories are not followed. If process raises, the exception is re-raised here.
+
+    Once 'window' directories are finished and waiting on an earlier one, workers
+    only pick up the directory that's being waited on.
+
+    If queued is given, it's called with the number of directories found each time
+    more are found (the roots, then each directory's subdirectories), e.g. to
+    estimate how much of the walk is left. It's called from the worker threads.
+
+    If include is given, it's called as include(directory, depth) for each of the rootpaths
+    (depth 0) and each directory directly under them (depth 1), e.g. to split a walk into
+    shards. A root path it returns False for is still listed, but isn't processed or
+    yielded. A top-level directory it returns False for is skipped, along with everything
+    under it.
+
+    If deviceJobs is given, at most that many directories on each device are processed at
+    once. device(directory) gives the device a directory is on (by default its st_dev).
+    """
+
+    threads = max(1, int(threads))
+    window  = max(1, int(window))
+
+    deviceJobs = max(0, int(deviceJobs))
+
+    lock    = threading.Condition()
+    pending = {} # device -> heap of (key, directory) waiting for a worker
+    running = {} # device -> number of its directories being processed
+    done    = {} # key -> (directory, listed, result, child keys)
+    state   = {"stop": False, "error": None, "next": None} # next: the key being waited on
+
+    def deviceKey(directory, entry=None):
+        "the device directory counts against. they all share one when there's no limit"
+
+        if not deviceJobs:
+            return None
+
+        if device is not None:
+            return device(directory)
+
+        return deviceOf(directory, entry)
+
+    def nextDevice():
+        """
+        (True, device) for the device of the directory to start next: the first pending one
+        in walk order on a device with room. if too many finished directories are already
+        held back, only the one being waited on can be started. (False, None) if nothing
+        can be started yet.
+        """
+
+        best = None
+
+        for dev, heap in pending.iteritems():
+            if not heap or (deviceJobs and running.get(dev, 0) >= deviceJobs):
+                continue
+
+            if len(done) >= window and heap[0][0] != state["next"]:
+                continue
+
+            if best is None or heap[0][0] < best[1][0][0]:
+                best = dev, heap
+
+        return (False, None) if best is None else (True, best[0])
+
+    # every directory gets a key: a tuple of indices leading to it from the roots.
+    # sorting keys gives os.walk's top-down order, e.g. (0,) < (0, 0) < (0, 0, 5) < (0, 1) < (1,)
+    for i, rootpath in enumerate(rootpaths):
+        heapq.heappush(pending.setdefault(deviceKey(rootpath), []), ((i,), rootpath))
+
+    if queued is not None:
+        queued(len(rootpaths))
+
+    def worker():
+        while True:
+            with lock:
+                # wait for a directory that can be started
+                while not state["stop"]:
+                    found, dev = nextDevice()
+
+                    if found:
+                        break
+
+                    lock.wait()
+
+                if state["stop"]:
+                    return
+
+                key, directory = heapq.heappop(pending[dev])
+                running[dev] = running.get(dev, 0) + 1
+
+            listed   = True
+            result   = None
+            children = []
+
+            try:
+                entries = scanDirectory(directory)
+            except OSError:
+                listed = False
+            else:
+                subdirs = [e for e in entries if e.is_dir() and not e.is_symlink()]
+
+                if include is not None and len(key) == 1:
+                    subdirs = [e for e in subdirs if include(e.path, 1)]
+                    listed  = include(directory, 0) # only yielded if it's included
+
+                children = [(key + (n,), e.path) for n, e in enumerate(subdirs)]
+                devices  = [deviceKey(e.path, e) for e in subdirs]
+
+                # queue up the subdirectories before processing this one, so the
+                # other workers have something to do in the meantime
+                if children:
+                    with lock:
+                        for child, childDevice in zip(children, devices):
+                            heapq.heappush(pending.setdefault(childDevice, []), child)
+                        lock.notify_all()
+
+                    if queued is not None:
+                        queued(len(children))
+
+                try:
+                    if listed:
+                        result = process(directory, entries)
+                except BaseException:
+                    with lock:
+                        state["error"] = sys.exc_info()
+                        running[dev] -= 1
+                        lock.notify_all()
+                    return
+
+            with lock:
+                done[key] = (directory, listed, result, [c[0] for c in children])
+                running[dev] -= 1
+                lock.notify_all()
+
+    workers = [threading.Thread(target=worker) for n in xrange(threads)]
+
+    for t in workers:
+        t.daemon = True
+        t.start()
+
+    try:
+        # walk the tree in order, waiting on each directory in turn
+        expected = [(i,) for i in reversed(xrange(len(rootpaths)))]
+
+        while expected:
+            key = expected.pop()
+
+            with lock:
+                state["next"] = key
+                lock.notify_all()
+
+                while key not in done and state["error"] is None:
+                    lock.wait(1.0) # a timeout keeps the main thread responsive to Ctrl-C
+
+                if state["error"] is not None:
+                    error = state["error"]
+                    raise error[0], error[1], error[2]
+
+                directory, listed, result, child_keys = done.pop(key)
+                lock.notify_all() # there's room in the window again
+
+            expected.extend(reversed(child_keys))
+
+            if listed:
+                yield directory, result
+
+    finally:
+        with lock:
+            state["stop"] = True
+            lock.notify_all()
+
+        # let any directory that's already being processed finish
+        for t in workers:
+            t.join()
@@ -0,0 +1,283 @@
+"""
+Watch
+
+Watches one or more directory trees with inotify (Linux only), and re-runs
+a directory's processing whenever files land in it. This lets the indexer
+keep its output up to date as cards are copied onto a volume, instead of
+walking the whole volume again.
+
+The trees are walked once to begin with (with Traversal.walk), adding a
+watch to every directory on the way. After that, only the directories that
+see files created, written, moved or deleted are processed again.
+
+Events are batched per directory, and a directory is only processed once
+it has settled: no events for 'settle' seconds, and no files in it still
+open for writing. So a sequence that's still being copied, a frame at a
+time, isn't picked up half-finished. (If a file stays open without any
+events for 'stall' seconds, its writer is assumed to have gone away and
+the directory is processed anyway.)
+
+
+USAGE:
+    import Watch
+
+    def process(directory, entries):
+        return CameraMetadata.listDirectory(directory, entries=entries)
+
+    for directory, result in Watch.watch(["/Volumes/INGEST"], process):
+        if directory is None:
+            pass                # a batch is finished (starting with the first walk)
+        elif result is None:
+            pass                # directory has gone, along with everything under it
+        else:
+            print directory, result
+
+The generator runs until it's closed or interrupted.
+"""
+
+# Standard python libraries
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# Custom dependencies
+import Traversal
+
+
+DEFAULT_SETTLE = 5      # seconds a directory has to be quiet before it's processed
+DEFAULT_STALL  = 600    # seconds before a file that's open for writing, with no events, is given up on
+
+# inotify event masks. see inotify(7)
+IN_MODIFY       = 0x00000002
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_MOVE_SELF    = 0x00000800
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_ISDIR        = 0x40000000
+
+IN_NONBLOCK     = os.O_NONBLOCK
+IN_CLOEXEC      = 0x00080000
+
+WATCH_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | \
+             IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, length of name
+READ_SIZE    = 65536
+
+
+# -----inotify ------------------------------------------------------------------------------
+
+try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1
+except (OSError, AttributeError):
+    libc = None # not Linux
+
+available = libc is not None
+
+
+class Inotify:
+    "A minimal wrapper around an inotify instance"
+
+    def __init__(self):
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify isn't available on this system")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def addWatch(self, path, mask=WATCH_MASK):
+        "Watches path. Returns the watch descriptor, or raises OSError."
+
+        wd = libc.inotify_add_watch(self.fd, path, mask)
+
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+
+        return wd
+
+    def read(self, timeout=None):
+        "Waits up to timeout seconds for events, and returns a list of (wd, mask, name)"
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        pos = 0
+
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+
+            # the name is padded out with nulls
+            name = data[pos:pos + length].rstrip("\0")
+            pos += length
+
+            events.append((wd, mask, name))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+# -----Watching -----------------------------------------------------------------------------
+
+def watch(rootpaths, process, threads=Traversal.DEFAULT_THREADS, settle=DEFAULT_SETTLE, stall=DEFAULT_STALL, queued=None):
+    """
+    Generator that walks every directory under rootpaths, calling process(directory, entries)
+    for each one like Traversal.walk, and then watches them, calling process again for each
+    directory that changes, once it's settled.
+
+    Yields (directory, result) for each directory processed, (directory, None) when a
+    directory has been deleted or moved away (along with everything under it), and
+    (None, None) at the end of each batch, including the first walk.
+
+    queued is passed on to Traversal.walk for the first walk.
+    """
+
+    inotify = Inotify()
+
+    lock        = threading.Lock()
+    directories = {} # wd -> directory
+    dirty       = {} # directory -> time of its last event
+    writing     = {} # directory -> names of files that are open for writing
+
+    started = time.time()
+
+    def addWatch(directory):
+        try:
+            wd = inotify.addWatch(directory)
+        except OSError:
+            return False # gone already, or not a directory
+
+        with lock:
+            directories[wd] = directory
+
+        return True
+
+    def addTree(directory, now):
+        "Watches a new directory and everything under it, and queues them all up to be processed"
+
+        for d, subdirs, names in os.walk(directory):
+            if addWatch(d):
+                dirty[d] = now
+
+    def processAndWatch(directory, entries):
+        addWatch(directory)
+
+        # anything that landed between listing the directory and watching it would be
+        # missed, so look at the directory again once the walk is done if it's changed
+        try:
+            if os.stat(directory).st_mtime >= started:
+                dirty[directory] = time.time()
+        except OSError:
+            pass
+
+        return process(directory, entries)
+
+    try:
+        for directory, result in Traversal.walk(rootpaths, processAndWatch, threads, queued=queued):
+            yield directory, result
+
+        yield None, None
+
+        while True:
+            now = time.time()
+
+            # wait until the next directory is due to settle, or for more events
+            if dirty:
+                timeout = max(0, min(dirty.values()) + settle - now)
+            else:
+                timeout = None
+
+            events = inotify.read(timeout)
+            now = time.time()
+
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # events were lost, so everything has to be looked at again
+                    for d in directories.values():
+                        dirty[d] = now
+                    continue
+
+                directory = directories.get(wd)
+
+                if directory is None:
+                    continue
+
+                if mask & IN_IGNORED:
+                    # the watch has gone, because the directory has
+                    with lock:
+                        del directories[wd]
+                    continue
+
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    dirty[directory] = now
+                    continue
+
+                path = os.path.join(directory, name)
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        addTree(path, now)
+
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        dirty.pop(path, None)
+                        writing.pop(path, None)
+                        yield path, None
+
+                    continue
+
+                if mask & IN_CREATE:
+                    writing.setdefault(directory, set()).add(name)
+                elif mask & (IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_FROM):
+                    writing.get(directory, set()).discard(name)
+
+                dirty[directory] = now
+
+            # process the directories that have settled
+            due = [d for d, t in dirty.items()
+                   if now - t >= settle and (not writing.get(d) or now - t >= stall)]
+
+            if not due:
+                continue
+
+            for directory in sorted(due):
+                del dirty[directory]
+                writing.pop(directory, None)
+
+                try:
+                    entries = Traversal.scanDirectory(directory)
+                except OSError:
+                    yield directory, None # it's gone
+                    continue
+
+                yield directory, process(directory, entries)
+
+            yield None, None
+
+    finally:
+        inotify.close()
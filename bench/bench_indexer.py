@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for the whole indexer
+
+Generates a synthetic tree of media on disk and times each stage of
+indexing it:
+
+    GetSequences    grouping the files of each directory into sequences
+    listDirectory   extracting the metadata of each directory (no catalog)
+    writeCSV        writing all of the results out
+    indexer         a complete run, with a new catalog and then again with it warm
+
+For each stage it reports the wall time, files/s and the peak RSS of the
+process so far, so changes can be checked for regressions.
+
+The tree has DPX and EXR sequences (with real headers), gappy sequences,
+MOV and MP4 files, XDCAM clip folders and R3D clips. Nothing in it is real
+media, so MediaInfo and REDline are replaced with stand-ins: a fake
+pymediainfo module that returns fixed tracks, and a shell script that
+prints REDline's CSV. Both can be given a delay, to simulate real parsing
+costs. Everything else (lxml) has to be installed as usual.
+
+Usage:
+    python bench/bench_indexer.py [options]
+
+Options:
+    --dpx N             DPX sequences (default 20)
+    --exr N             EXR sequences (default 20)
+    --gappy N           DPX sequences with missing frames (default 10)
+    --frames N          frames per sequence (default 200)
+    --mov N             MOV files (default 100)
+    --mp4 N             MP4 files (default 100)
+    --xdcam N           XDCAM clip folders (default 20)
+    --r3d N             R3D clips, of 3 spans each (default 20)
+    --mediainfo-delay S seconds the MediaInfo stand-in takes per file (default 0)
+    --redline-delay S   seconds the REDline stand-in takes per clip (default 0)
+    --threads N         threads for the indexer stage (default Traversal.DEFAULT_THREADS)
+    --root DIR          where to generate the tree (default a temporary directory)
+    --keep              don't delete the tree afterwards
+"""
+
+# Standard python libraries
+import os
+import sys
+import imp
+import time
+import types
+import getopt
+import struct
+import shutil
+import random
+import resource
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, "..")
+
+sys.path.insert(0, REPO_DIR)
+
+
+# -----Stand-ins ----------------------------------------------------------------------------
+
+class FakeTrack(object):
+    "A MediaInfo track, with just the attributes VIDEOMetadata reads"
+
+    def __init__(self, track_type, **attributes):
+        self.track_type = track_type
+        self.__dict__.update(attributes)
+
+
+class FakeMediaInfo(object):
+    "Stands in for pymediainfo.MediaInfo. Every file is a 10 second 23.976 clip starting at 01:00:00:00."
+
+    delay = 0
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+
+    @classmethod
+    def parse(cls, filename):
+        if cls.delay:
+            time.sleep(cls.delay)
+
+        duration = 10010.0 # ms, 240 frames at 23.976
+
+        return cls([FakeTrack("General"),
+                    FakeTrack("Video", frame_rate="23.976", duration=duration),
+                    FakeTrack("Audio"),
+                    FakeTrack("Other", time_code_of_first_frame="01:00:00:00", duration=duration)])
+
+
+def installMediaInfo(delay):
+    "Puts the MediaInfo stand-in in place of pymediainfo. Has to happen before CameraMetadata is imported."
+
+    FakeMediaInfo.delay = delay
+
+    module = types.ModuleType("pymediainfo")
+    module.MediaInfo = FakeMediaInfo
+    sys.modules["pymediainfo"] = module
+
+
+REDLINE_SCRIPT = """#!/bin/sh
+# stand-in for REDline -i clip_001.R3D --printMeta 3
+sleep %s
+clip=`basename "$2" _001.R3D`
+echo '"File Path","Clip Name","Abs TC","End Abs TC","Total Frames","Record FPS"'
+echo "\\"$2\\",\\"$clip\\",\\"01:00:00:00\\",\\"01:00:09:23\\",\\"240\\",\\"23.976\\""
+"""
+
+def makeREDline(directory, delay):
+    "Writes the REDline stand-in to directory and returns its path"
+
+    path = os.path.join(directory, "REDline")
+
+    with open(path, "w") as f:
+        f.write(REDLINE_SCRIPT % delay)
+
+    os.chmod(path, 0755)
+    return path
+
+
+# -----Tree generation ----------------------------------------------------------------------
+
+def bcd(value):
+    "Packs a two digit number as BCD"
+
+    return (value / 10) << 4 | value % 10
+
+def dpxHeader(frame):
+    "A big-endian DPX header with a resolution, framerate and timecode (01:00:00:00 + frame at 24fps)"
+
+    header = bytearray(2048)
+    header[0:4] = "SDPX"
+
+    ss, ff = divmod(frame, 24)
+    mm, ss = divmod(ss, 60)
+
+    struct.pack_into(">II", header, 772, 2048, 1556)
+    struct.pack_into(">f", header, 1724, 24.0)
+    struct.pack_into(">I", header, 1920, bcd(1) << 24 | bcd(mm) << 16 | bcd(ss) << 8 | bcd(ff))
+    struct.pack_into(">f", header, 1940, 24.0)
+
+    return str(header)
+
+def exrAttribute(name, kind, value):
+    return name + "\0" + kind + "\0" + struct.pack("<i", len(value)) + value
+
+def exrHeader(frame):
+    "An OpenEXR header with timeCode, framesPerSecond and dataWindow attributes"
+
+    ss, ff = divmod(frame, 24)
+    mm, ss = divmod(ss, 60)
+
+    timecode = bcd(1) << 24 | bcd(mm) << 16 | bcd(ss) << 8 | bcd(ff)
+
+    return "\x76\x2f\x31\x01" + struct.pack("<I", 2) + \
+           exrAttribute("channels", "chlist", "\0") + \
+           exrAttribute("dataWindow", "box2i", struct.pack("<iiii", 0, 0, 1919, 1079)) + \
+           exrAttribute("framesPerSecond", "rational", struct.pack("<iI", 24000, 1001)) + \
+           exrAttribute("timeCode", "timecode", struct.pack("<II", timecode, 0)) + \
+           "\0"
+
+XDCAM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<NonRealTimeMeta xmlns="urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20" lastUpdate="2013-12-16T14:41:19+02:00">
+    <Duration value="240"/>
+    <LtcChangeTable tcFps="24" halfStep="false">
+        <LtcChange frameCount="0" value="00000001" status="increment"/>
+        <LtcChange frameCount="239" value="23090001" status="end"/>
+    </LtcChangeTable>
+</NonRealTimeMeta>
+"""
+
+def uniqueData(path, size):
+    "size bytes that are different for every path, so no two files share a catalog fingerprint"
+
+    return (path + "\0" * size)[:size] if len(path) < size else path
+
+def writeFile(path, data=""):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def makeTree(root, counts, seed=0):
+    "Generates the synthetic tree under root. Returns the number of files in it."
+
+    rng = random.Random(seed)
+    files = 0
+
+    def mkdir(*parts):
+        path = os.path.join(root, *parts)
+        os.makedirs(path)
+        return path
+
+    for kind, header, ext in (("dpx", dpxHeader, ".dpx"), ("exr", exrHeader, ".exr"), ("gappy", dpxHeader, ".dpx")):
+        for n in xrange(counts[kind]):
+            # a few sequences to a folder, like a VFX delivery
+            folder = os.path.join(root, kind, "reel%02d" % (n / 4))
+
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            start = rng.randint(0, 1000)
+
+            for frame in xrange(start, start + counts["frames"]):
+                if kind == "gappy" and rng.random() < 0.05:
+                    continue
+
+                path = os.path.join(folder, "shot%03d_v01.%07d%s" % (n, frame, ext))
+                writeFile(path, header(frame) + path) # after the header, so every sequence is unique
+                files += 1
+
+    for kind in ("mov", "mp4"):
+        for n in xrange(counts[kind]):
+            folder = os.path.join(root, kind, "day%02d" % (n / 25))
+
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            path = os.path.join(folder, "A%03d_%04d.%s" % (n / 25, n, kind))
+            writeFile(path, uniqueData(path, 4096))
+            files += 1
+
+    for n in xrange(counts["xdcam"]):
+        folder = mkdir("xdcam", "CLPR", "C%04d" % n)
+
+        for suffix in (".MP4", "M01.XML", "R01.BIM", "I01.PPN", ".SMI"):
+            path = os.path.join(folder, "C%04d%s" % (n, suffix))
+            writeFile(path, XDCAM_XML if suffix.endswith("XML") else uniqueData(path, 1024))
+            files += 1
+
+    for n in xrange(counts["r3d"]):
+        clip = "A%03d_C%03d_0101AB" % (n / 10, n)
+        folder = mkdir("r3d", "A%03d" % (n / 10), clip + ".RDC")
+
+        for span in (1, 2, 3):
+            path = os.path.join(folder, "%s_%03d.R3D" % (clip, span))
+            writeFile(path, uniqueData(path, 4096))
+            files += 1
+
+        # the quicktime proxies REDCINE writes alongside, which the indexer skips
+        path = os.path.join(folder, "%s_F.mov" % clip)
+        writeFile(path, uniqueData(path, 1024))
+        files += 1
+
+    return files
+
+
+# -----Measurement --------------------------------------------------------------------------
+
+def peakRSS():
+    "Peak resident set size of this process so far, in MB"
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on OS X
+    if sys.platform == "darwin":
+        return rss / 1048576.0
+
+    return rss / 1024.0
+
+class Quiet:
+    "Sends stdout to /dev/null, for the stages that print progress"
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+def report(stage, elapsed, files):
+    print "%-26s %9.3f s %12.0f files/s %9.1f MB peak RSS" % (stage, elapsed, files / max(elapsed, 1e-9), peakRSS())
+
+
+if __name__ == "__main__":
+    counts = {"dpx": 20, "exr": 20, "gappy": 10, "frames": 200,
+              "mov": 100, "mp4": 100, "xdcam": 20, "r3d": 20}
+
+    mediainfo_delay = 0
+    redline_delay   = 0
+    threads         = None
+    root            = None
+    keep            = False
+
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "", ["%s=" % k for k in counts] +
+                                       ["mediainfo-delay=", "redline-delay=", "threads=", "root=", "keep"])
+    except getopt.GetoptError as e:
+        print e
+        print __doc__
+        sys.exit(1)
+
+    for opt, value in opts:
+        if opt[2:] in counts:
+            counts[opt[2:]] = int(value)
+        elif opt == "--mediainfo-delay":
+            mediainfo_delay = float(value)
+        elif opt == "--redline-delay":
+            redline_delay = float(value)
+        elif opt == "--threads":
+            threads = int(value)
+        elif opt == "--root":
+            root = value
+        elif opt == "--keep":
+            keep = True
+
+    installMediaInfo(mediainfo_delay)
+
+    # Custom dependencies. imported after the stand-in is in place
+    import CameraMetadata
+    import Catalog
+    import Traversal
+    import REDline
+    from seq import seq
+
+    # MediaIndexer is a script, without a .py extension
+    MediaIndexer = imp.load_source("MediaIndexer", os.path.join(REPO_DIR, "MediaIndexer"))
+
+    if threads is None:
+        threads = Traversal.DEFAULT_THREADS
+
+    workdir = tempfile.mkdtemp(prefix="bench_indexer.")
+
+    if root is None:
+        root = os.path.join(workdir, "tree")
+
+    CameraMetadata.REDLINE = REDline.Runner(makeREDline(workdir, redline_delay))
+
+    try:
+        start = time.time()
+        files = makeTree(root, counts)
+
+        print "files:         %d" % files
+        print "generated in:  %.3f s" % (time.time() - start)
+        print "numpy:         %s" % (seq.numpy and seq.numpy.__version__ or "not installed")
+        print
+
+        # list every directory up front, so the first two stages only time their own work
+        directories = [(d, Traversal.scanDirectory(d)) for d, subdirs, names in os.walk(root)]
+
+        start = time.time()
+        for d, entries in directories:
+            seq.SequenceList(d).GetSequences(False, [e for e in entries if not e.is_dir()])
+        report("GetSequences", time.time() - start, files)
+
+        metadata = []
+
+        start = time.time()
+        for d, entries in directories:
+            metadata.extend(CameraMetadata.listDirectory(d, entries=entries) or [])
+        report("listDirectory", time.time() - start, files)
+
+        start = time.time()
+        MediaIndexer.writeCSV(metadata, os.path.join(workdir, "writeCSV.csv"))
+        report("writeCSV (%d rows)" % len(metadata), time.time() - start, files)
+
+        catalog = Catalog.Catalog(os.path.join(workdir, "bench.catalog"))
+
+        for stage in ("indexer (cold catalog)", "indexer (warm catalog)"):
+            output = MediaIndexer.CSVOutput(os.path.join(workdir, "indexer.csv"))
+
+            start = time.time()
+            with Quiet():
+                MediaIndexer.indexer([root], output, catalog, threads, verbose=False)
+                output.close()
+            report(stage, time.time() - start, files)
+
+        catalog.close()
+
+    finally:
+        if keep:
+            print
+            print "kept %s" % workdir
+        else:
+            shutil.rmtree(workdir)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmark for seq.SequenceList.GetSequences
+
+Generates synthetic filenames (no files are created on disk) and times how
+long GetSequences takes to classify and group them. Reports the per-file
+cost, so changes to the grouping core can be compared.
+
+The filenames are a mix of continuous DPX/EXR/ARI sequences, gappy
+sequences, single frames and unrelated files.
+
+Usage:
+    python bench/bench_sequences.py [number of files]    (default 1000000)
+"""
+
+# Standard python libraries
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Custom dependencies
+from seq import seq
+
+
+class FakeStat(object):
+    "Just enough of an os.stat result for GetSequences"
+
+    __slots__ = ("st_size",)
+
+    def __init__(self, size):
+        self.st_size = size
+
+
+class FakeEntry(object):
+    "A directory entry that doesn't exist on disk, with a cached stat() like scandir's DirEntry"
+
+    __slots__ = ("name", "_stat")
+
+    def __init__(self, name, size):
+        self.name = name
+        self._stat = FakeStat(size)
+
+    def stat(self):
+        return self._stat
+
+
+def makeEntries(count, seed=0):
+    "Returns roughly 'count' fake entries for a single directory"
+
+    rng = random.Random(seed)
+    entries = []
+    shot = 0
+
+    while len(entries) < count:
+        kind = rng.random()
+        shot += 1
+
+        if kind < 0.6:
+            # a long continuous scan
+            ext = rng.choice([".dpx", ".exr", ".ari"])
+            start = rng.randint(0, 86400)
+            frames = xrange(start, start + rng.randint(100, 5000))
+        elif kind < 0.9:
+            # a gappy render
+            ext = rng.choice([".dpx", ".exr"])
+            start = rng.randint(0, 1000)
+            frames = [f for f in xrange(start, start + rng.randint(50, 2000)) if rng.random() > 0.01]
+        else:
+            # stills and unrelated files
+            ext = rng.choice([".dpx", ".txt", ".mov", ".exr"])
+            frames = [rng.randint(0, 99)]
+
+        for f in frames:
+            entries.append(FakeEntry("shot%05d_v01.%07d%s" % (shot, f, ext), 12746752))
+
+    return entries[:count]
+
+
+if __name__ == "__main__":
+    try:
+        count = int(sys.argv[1])
+    except IndexError:
+        count = 1000000
+
+    print "Generating %d filenames..." % count
+    entries = makeEntries(count)
+
+    start = time.time()
+    sequences = seq.SequenceList("/bench").GetSequences(False, entries)
+    elapsed = time.time() - start
+
+    print "numpy:         %s" % (seq.numpy and seq.numpy.__version__ or "not installed")
+    print "files:         %d" % count
+    print "sequences:     %d" % len(sequences)
+    print "total time:    %.3f s" % elapsed
+    print "per file:      %.3f us" % (elapsed / count * 1e6)
+    print "files/s:       %.0f" % (count / elapsed)
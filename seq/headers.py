@@ -0,0 +1,383 @@
+'''
+HEADERS
+
+Reads the metadata we need (timecode, framerate and resolution) straight
+from the header of an image file, without decoding any of the image.
+Only the header is read, in one or a few small, bounded reads.
+
+Supported formats:
+    DPX         timecode, framerate and resolution (SMPTE 268M television/film/image headers)
+    OpenEXR     timecode, framerate and resolution (timeCode, framesPerSecond and dataWindow attributes)
+    ARRIRAW     resolution only. the layout of the rest of the header isn't publicly documented
+    R3D         framerate, resolution and frame count (RED1 header and REOB trailer). the
+                timecode isn't in either, so that still has to come from REDline
+
+
+** headers.ReadDPXHeader(path)                      Returns a dict with any of these keys, or None if the file
+                                                    isn't a DPX (or can't be read):
+                                                        'timecode'      e.g. "01:00:00:00". DPX doesn't say
+                                                                        whether it's drop-frame, so it's always
+                                                                        written with ':'
+                                                        'framerate'     e.g. 23.976 (a float)
+                                                        'resolution'    e.g. (2048, 1556)
+
+                                                    Fields that are undefined in the header are left out.
+
+** headers.ReadEXRHeader(path)                      Same, for OpenEXR files (the first part, for multi-part files).
+                                                    A drop-frame timeCode is written with ';', e.g. "01:00:00;00".
+
+** headers.ReadARIHeader(path)                      Same, for ARRIRAW files.
+
+** headers.ReadR3DHeader(path)                      Same, for one segment (e.g. _001.R3D) of an R3D clip, with
+                                                    'frames' (the number of frames in this segment) instead
+                                                    of 'timecode'. RED2 files aren't supported, and return None.
+
+** headers.ReadHeader(path)                         Same, for any format with a reader (picked by extension).
+                                                    Results are cached by path, size and mtime, so reading the
+                                                    first frame of a sequence more than once only costs one read
+                                                    (and a stat), and a frame that's rewritten is read again.
+'''
+
+import os
+import math
+import struct
+import threading
+
+# Custom dependencies
+import Stats
+
+
+# -----DPX ----------------------------------------------------------------------------------
+# all offsets are from the start of the file. see SMPTE 268M.
+
+DPX_HEADER_SIZE     = 2048  # file + image + orientation + film + television headers
+
+DPX_MAGIC_BIG       = 'SDPX'
+DPX_MAGIC_LITTLE    = 'XPDS'
+
+DPX_PIXELS_PER_LINE = 772   # U32, image header
+DPX_LINES           = 776   # U32, image header
+DPX_FILM_FRAME_RATE = 1724  # R32, film header
+DPX_TV_TIMECODE     = 1920  # U32 (BCD hh:mm:ss:ff), television header
+DPX_TV_FRAME_RATE   = 1940  # R32, television header
+
+DPX_UNDEFINED_U32   = 0xFFFFFFFF
+
+
+def ReadDPXHeader(path):
+    try:
+        with open(path, 'rb') as f, Stats.timer('headers.dpx') as t:
+            data = f.read(DPX_HEADER_SIZE)
+            t.bytes += len(data)
+    except (IOError, OSError):
+        return None
+
+    if len(data) < DPX_HEADER_SIZE:
+        return None
+
+    # the magic number tells us the byte order of everything else
+    if data[:4] == DPX_MAGIC_BIG:
+        endian = '>'
+    elif data[:4] == DPX_MAGIC_LITTLE:
+        endian = '<'
+    else:
+        return None
+
+    header = {}
+
+    width, height = struct.unpack_from(endian + 'II', data, DPX_PIXELS_PER_LINE)
+
+    if 0 < width < DPX_UNDEFINED_U32 and 0 < height < DPX_UNDEFINED_U32:
+        header['resolution'] = (width, height)
+
+    # prefer the television header's frame rate, then the film header's
+    for offset in (DPX_TV_FRAME_RATE, DPX_FILM_FRAME_RATE):
+        rate = ValidFramerate(struct.unpack_from(endian + 'f', data, offset)[0])
+
+        if rate is not None:
+            header['framerate'] = rate
+            break
+
+    # a timecode of all ones is undefined. a lot of software writes all zeroes when
+    # it doesn't know the timecode either, so that's treated as undefined too
+    timecode = struct.unpack_from(endian + 'I', data, DPX_TV_TIMECODE)[0]
+
+    if timecode not in (0, DPX_UNDEFINED_U32):
+        timecode = BCDTimecode(timecode)
+
+        if timecode is not None:
+            header['timecode'] = timecode
+
+    return header
+
+
+# -----OpenEXR ------------------------------------------------------------------------------
+# the header is a list of attributes (name, type, size, value), ending with an empty name.
+# see "The OpenEXR File Layout".
+
+EXR_MAGIC           = '\x76\x2f\x31\x01'
+EXR_READ_SIZE       = 16384     # read the header this much at a time
+EXR_MAX_HEADER      = 1048576   # give up if the attributes we want aren't in the first 1 MB
+
+EXR_ATTRIBUTES      = ('timeCode', 'framesPerSecond', 'dataWindow')
+
+
+def ReadEXRHeader(path):
+    try:
+        f = open(path, 'rb')
+    except (IOError, OSError):
+        return None
+
+    with f, Stats.timer('headers.exr') as t:
+        data = f.read(EXR_READ_SIZE)
+        t.bytes += len(data)
+
+        if data[:4] != EXR_MAGIC:
+            return None
+
+        header = {}
+        found = 0
+        offset = 0  # file offset of the start of data
+        pos = 8     # skip the magic number and version
+
+        while found < len(EXR_ATTRIBUTES) and offset + pos < EXR_MAX_HEADER:
+            # find the attribute's name and type, which are both null-terminated
+            nameEnd = data.find('\0', pos)
+            typeEnd = data.find('\0', nameEnd + 1)
+
+            if nameEnd == pos:
+                break # an empty name marks the end of the header
+
+            if nameEnd == -1 or typeEnd == -1 or typeEnd + 5 > len(data):
+                # the attribute runs past what we've read so far, so read on from its start
+                if len(data) < EXR_READ_SIZE or pos == 0:
+                    break # end of file, or a name longer than we're willing to read
+
+                offset += pos
+                f.seek(offset)
+                data = f.read(EXR_READ_SIZE)
+                t.bytes += len(data)
+                pos = 0
+                continue
+
+            name = data[pos:nameEnd]
+            size = struct.unpack_from('<i', data, typeEnd + 1)[0]
+            start = typeEnd + 5
+            pos = start + size
+
+            if size < 0:
+                break # corrupt
+
+            if name in EXR_ATTRIBUTES:
+                value = data[start:pos]
+
+                if len(value) < size:
+                    # too big to fit in what we've read
+                    f.seek(offset + start)
+                    value = f.read(size)
+                    t.bytes += len(value)
+
+                if len(value) == size:
+                    found += 1
+                    ParseEXRAttribute(header, name, value)
+
+            if pos > len(data):
+                # skip past large attributes we don't need (e.g. previews), without reading them
+                offset += pos
+                f.seek(offset)
+                data = f.read(EXR_READ_SIZE)
+                t.bytes += len(data)
+                pos = 0
+
+    return header
+
+def ParseEXRAttribute(header, name, value):
+    "Adds a decoded timeCode, framesPerSecond or dataWindow attribute value to header"
+
+    if name == 'timeCode' and len(value) >= 4:
+        # SMPTE 12M packed BCD, as the first 32 bits of the value
+        packed = struct.unpack_from('<I', value)[0]
+
+        frames  = (packed & 0x0f) + ((packed >> 4) & 0x03) * 10
+        drop    = packed & 0x40 # the drop-frame flag
+        seconds = ((packed >> 8) & 0x0f) + ((packed >> 12) & 0x07) * 10
+        minutes = ((packed >> 16) & 0x0f) + ((packed >> 20) & 0x07) * 10
+        hours   = ((packed >> 24) & 0x0f) + ((packed >> 28) & 0x03) * 10
+
+        if minutes < 60 and seconds < 60:
+            header['timecode'] = '%02d:%02d:%02d%s%02d' % (hours, minutes, seconds, ';' if drop else ':', frames)
+
+    elif name == 'framesPerSecond' and len(value) >= 8:
+        numerator, denominator = struct.unpack_from('<iI', value)
+
+        if denominator > 0:
+            rate = ValidFramerate(float(numerator) / denominator)
+
+            if rate is not None:
+                header['framerate'] = rate
+
+    elif name == 'dataWindow' and len(value) >= 16:
+        xMin, yMin, xMax, yMax = struct.unpack_from('<iiii', value)
+
+        if xMax >= xMin and yMax >= yMin:
+            header['resolution'] = (xMax - xMin + 1, yMax - yMin + 1)
+
+
+# -----ARRIRAW ------------------------------------------------------------------------------
+# a 4096 byte little-endian header, then the image data
+
+ARI_MAGIC           = 'ARRI'
+ARI_READ_SIZE       = 32
+ARI_WIDTH           = 20    # U32
+ARI_HEIGHT          = 24    # U32
+
+
+def ReadARIHeader(path):
+    try:
+        with open(path, 'rb') as f, Stats.timer('headers.ari') as t:
+            data = f.read(ARI_READ_SIZE)
+            t.bytes += len(data)
+    except (IOError, OSError):
+        return None
+
+    if len(data) < ARI_READ_SIZE or data[:4] != ARI_MAGIC:
+        return None
+
+    header = {}
+
+    width, height = struct.unpack_from('<II', data, ARI_WIDTH)
+
+    if width > 0 and height > 0:
+        header['resolution'] = (width, height)
+
+    return header
+
+
+# -----R3D ----------------------------------------------------------------------------------
+# big-endian atoms: U32 size, then a four character tag. a RED1 atom starts the file, and a
+# REOB atom with the offsets and sizes of the frame indexes ends it. the same layout is
+# used by FFmpeg's r3d demuxer.
+
+R3D_RED1            = 'RED1'
+R3D_REOB            = 'REOB'
+R3D_READ_SIZE       = 128   # enough of the RED1 atom for everything we need
+R3D_REOB_SIZE       = 56    # the whole REOB atom
+
+R3D_WIDTH           = 56    # U32, from the start of the RED1 atom
+R3D_HEIGHT          = 60    # U32
+R3D_FRAME_RATE      = 66    # U16 numerator, U16 denominator
+R3D_VIDEO_FRAMES    = 24    # U32, from the start of the REOB atom
+
+
+def ReadR3DHeader(path):
+    try:
+        with open(path, 'rb') as f, Stats.timer('headers.r3d') as t:
+            data = f.read(R3D_READ_SIZE)
+            t.bytes += len(data)
+
+            if len(data) < R3D_READ_SIZE or data[4:8] != R3D_RED1:
+                return None
+
+            # the REOB atom is the last thing in the file
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+
+            if size < R3D_READ_SIZE + R3D_REOB_SIZE:
+                return None
+
+            f.seek(size - R3D_REOB_SIZE)
+            trailer = f.read(R3D_REOB_SIZE)
+            t.bytes += len(trailer)
+    except (IOError, OSError):
+        return None
+
+    header = {}
+
+    width, height = struct.unpack_from('>II', data, R3D_WIDTH)
+
+    if width > 0 and height > 0:
+        header['resolution'] = (width, height)
+
+    numerator, denominator = struct.unpack_from('>HH', data, R3D_FRAME_RATE)
+
+    if denominator > 0:
+        rate = ValidFramerate(float(numerator) / denominator)
+
+        if rate is not None:
+            header['framerate'] = rate
+
+    # a segment that's still being written (or was cut short) has no trailer yet
+    if len(trailer) == R3D_REOB_SIZE and trailer[4:8] == R3D_REOB and \
+            struct.unpack_from('>I', trailer)[0] == R3D_REOB_SIZE:
+        header['frames'] = struct.unpack_from('>I', trailer, R3D_VIDEO_FRAMES)[0]
+
+    return header
+
+
+# -----Helpers ------------------------------------------------------------------------------
+
+def ValidFramerate(rate):
+    "Returns rate, rounded to 3 decimal places, if it's a plausible framerate, or None"
+
+    # undefined floats are stored as all ones, which reads as NaN
+    if math.isnan(rate) or math.isinf(rate) or rate <= 0 or rate > 1000:
+        return None
+
+    return round(rate, 3)
+
+def BCDTimecode(value):
+    "Converts a 32-bit binary-coded-decimal timecode (0xHHMMSSFF) to 'HH:MM:SS:FF', or None if it isn't valid"
+
+    digits = '%08x' % value
+
+    if not digits.isdigit():
+        return None # a nibble over 9 isn't BCD
+
+    hh, mm, ss, ff = digits[0:2], digits[2:4], digits[4:6], digits[6:8]
+
+    if int(mm) > 59 or int(ss) > 59:
+        return None
+
+    return '%s:%s:%s:%s' % (hh, mm, ss, ff)
+
+
+# -----Dispatch and caching -----------------------------------------------------------------
+
+# readers for each extension (lowercase, with the dot)
+READERS = {'.dpx': ReadDPXHeader,
+           '.exr': ReadEXRHeader,
+           '.ari': ReadARIHeader}
+
+CACHE_SIZE = 4096
+
+cache = {} # (path, size, mtime) -> header
+cacheLock = threading.Lock()
+
+def ReadHeader(path):
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+
+    if reader is None:
+        return None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    # keyed on the size and mtime as well, so a frame that was still being written, or
+    # has been rendered again since (e.g. in watch mode), isn't stuck with its old header
+    key = (path, st.st_size, st.st_mtime)
+
+    with cacheLock:
+        if key in cache:
+            return cache[key]
+
+    header = reader(path)
+
+    with cacheLock:
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+
+        cache[key] = header
+
+    return header
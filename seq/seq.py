@@ -100,13 +100,21 @@ USAGE
     dpx.Sequence().MiddleFile()			    Returns the filename of the middle frame in the sequence.
     dpx.Sequence().MiddleFileWithPath()		    Returns the path filename of the middle frame.
     
-    dpx.Sequence().AllFiles()                       Returns a list containing all filenames in the sequence.
-    dpx.Sequence().AllFilesWithPath()               Returns a list containing the path and filenames of all frames.
+    dpx.Sequence().AllFiles()                       Returns a view of all filenames in the sequence. Views are
+                                                    lazy, like xrange: each item is only built when it's asked
+                                                    for, so they take the same memory for 1M frames as for 10.
+                                                    They support iteration, len(), indexing, slicing (which
+                                                    returns another view) and 'in', which is O(1).
+
+    dpx.Sequence().AllFilesWithPath()               Returns a view of the path and filenames of all frames.
+
+    dpx.Sequence().AllFiles().Existing()            Iterates over only the items whose files are on disk,
+                                                    checking each one as it goes. Works on any of the views.
     
     dpx.Sequence().FirstFrame()                     Returns an integer of the first frame number in the sequence.
     dpx.Sequence().LastFrame()                      Returns an integer of the last frame number in the sequence.
     
-    dpx.Sequence().AllFrames()                      Returns a list containing integers of all frames in the sequence.
+    dpx.Sequence().AllFrames()                      Returns a view of the integers of all frames in the sequence.
     
     dpx.Sequence().TotalFiles()                     Returns an integer representing the total number of files in
                                                     the sequence.
@@ -122,6 +130,9 @@ USAGE
 							['filename_%07d','.dpx','int(firstframe)','int(lastframe)','filename_%07d[firstframe-lastframe].dpx','path/to/formatted_name','float(size)']
 							* Note: the size is the total size of the sequence (all the frame sizes added up)
 
+    dpx.SequenceList().GetSequences(False, entries)  Same, but groups the given directory entries (e.g. from scandir)
+                                                    instead of listing the folder again.
+
 '''
 
 # validation in case numpy isn't installed
@@ -131,13 +142,12 @@ except:
     numpy = False
 #import wx
 import time
+import array
 import struct
 import os
 import sys
 import dpx_header_table
 import binascii
-import fnmatch
-import re
 #from wx.lib.mixins.listctrl import ListCtrlAutoWidthMixin, ColumnSorterMixin
 
 USE_BUFFERED_DC = 1 # for paint
@@ -168,7 +178,151 @@ HEADER_IMAGE = xrange(16, 35) # image construction data
 
 
 
+# extensions of files that can be part of a sequence. like the rest of this module,
+# they're matched case-sensitively
+SEQUENCE_EXTENSIONS = frozenset(['.dpx', '.tif', '.cin', '.exr', '.ari'])
+
+# frame numbers are the digits at the end of the filename, before the extension
+FRAME_DIGITS = '0123456789'
+
+# formatting strings for each padded length of frame number, e.g. PADDING[7] = '%07d'
+PADDING = ['%%0%dd' % n for n in xrange(32)]
+
+# the largest frame number that fits in the frame arrays
+MAX_FRAME = 2 ** (array.array('l').itemsize * 8 - 1) - 1
+
+
 # -----DPX File sequence parser ----------------------------------------------------------
+class FrameView(object):
+    """
+    A lazy, read-only view of a run of frames, like xrange. Depending on kind, items are
+    frame numbers ('frame'), filenames made from pattern % frame ('file'), or those
+    filenames joined to directory ('path'). Nothing is stored per frame, so a view of a
+    1M frame sequence is as small as any other.
+    """
+
+    __slots__ = ("first", "count", "step", "pattern", "directory", "kind")
+
+    def __init__(self, first, count, step, pattern, directory, kind):
+        self.first = first
+        self.count = max(0, count)
+        self.step = step
+        self.pattern = pattern
+        self.directory = directory
+        self.kind = kind
+
+    def item(self, frame):
+        if self.kind == 'frame':
+            return frame
+
+        name = self.pattern % frame
+
+        if self.kind == 'file':
+            return name
+
+        return os.path.join(self.directory, name)
+
+    def frame(self, item):
+        "Returns the frame number item stands for, or None if it isn't one of this view's items"
+
+        if self.kind == 'frame':
+            if isinstance(item, (int, long)):
+                return item
+            return None
+
+        if not isinstance(item, basestring):
+            return None
+
+        if self.kind == 'path':
+            directory, item = os.path.split(item)
+
+            if directory != self.directory:
+                return None
+
+        # the frame number is the digits before the extension. there can't be
+        # more of them than the padding, but there can be fewer
+        base, ext = os.path.splitext(item)
+        name = base.rstrip(FRAME_DIGITS)
+
+        if len(name) == len(base):
+            return None
+
+        frame = int(base[len(name):])
+
+        if self.pattern % frame != item:
+            return None
+
+        return frame
+
+    def indexOf(self, frame):
+        "Returns the index of frame in the view, or None if it isn't there"
+
+        if frame is None:
+            return None
+
+        offset = frame - self.first
+
+        if offset % self.step:
+            return None
+
+        index = offset // self.step
+
+        if 0 <= index < self.count:
+            return index
+
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for n in xrange(self.count):
+            yield self.item(self.first + n * self.step)
+
+    def __reversed__(self):
+        for n in xrange(self.count - 1, -1, -1):
+            yield self.item(self.first + n * self.step)
+
+    def __contains__(self, item):
+        return self.indexOf(self.frame(item)) is not None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            count = len(xrange(start, stop, step))
+
+            return FrameView(self.first + start * self.step, count, self.step * step,
+                             self.pattern, self.directory, self.kind)
+
+        if index < 0:
+            index += self.count
+
+        if not 0 <= index < self.count:
+            raise IndexError("FrameView index out of range")
+
+        return self.item(self.first + index * self.step)
+
+    def index(self, item):
+        index = self.indexOf(self.frame(item))
+
+        if index is None:
+            raise ValueError("%r is not in the sequence" % (item,))
+
+        return index
+
+    def Existing(self):
+        "Iterates over the items whose files exist on disk, checking each one as it goes"
+
+        for n in xrange(self.count):
+            frame = self.first + n * self.step
+
+            if os.path.exists(os.path.join(self.directory, self.pattern % frame)):
+                yield self.item(frame)
+
+    def __repr__(self):
+        return "<FrameView of %d items>" % self.count
+
+
 class Sequence():
     def __init__(self, dpxpath):
         self.dpxpath = dpxpath
@@ -219,22 +373,11 @@ class Sequence():
         return os.path.join(self.sequencedir, lastFile)
     
     def AllFiles(self):
-        self.allFiles = []
-        
-        for i in xrange(int(self.firstframe), int(self.lastframe) + 1):
-            seqFile = self.filePattern % i
-            self.allFiles.append(seqFile)
-            
-        return self.allFiles
+        # a lazy view, rather than a list, so huge sequences don't cost any memory
+        return FrameView(self.firstframe, self.totFiles, 1, self.filePattern, self.sequencedir, 'file')
     
     def AllFilesWithPath(self):
-        self.allFilesWithPath = []
-        
-        for i in xrange(int(self.firstframe), int(self.lastframe) + 1):
-            seqFile = self.filePattern % i
-            self.allFilesWithPath.append(os.path.join(self.sequencedir, seqFile))
-        
-        return self.allFilesWithPath
+        return FrameView(self.firstframe, self.totFiles, 1, self.filePattern, self.sequencedir, 'path')
     
     def FirstFrame(self):
         return self.firstframe
@@ -243,201 +386,191 @@ class Sequence():
         return self.lastframe
     
     def AllFrames(self):
-        self.allFrames = []
-        
-        for i in xrange(self.firstframe, self.lastframe + 1):
-            self.allFrames.append(i)
-        
-        return self.allFrames
+        return FrameView(self.firstframe, self.totFiles, 1, self.filePattern, self.sequencedir, 'frame')
         
     def TotalFiles(self):
         return self.totFiles
     
     def ValidateFrame(self, frame):
-        if int(frame) >= self.firstframe and int(frame) <= self.lastframe:
-            return True
-        else:
-            return False
+        if not isinstance(frame, (int, long)):
+            frame = int(frame)
+
+        return self.firstframe <= frame <= self.lastframe
+
+def SplitFrameRuns(frames, sizes):
+    """
+    Splits a sequence's frames into continuous runs.
+
+    frames and sizes are parallel arrays (array.array, or anything numpy can
+    take) of frame numbers and file sizes, in any order. Returns a list of
+    (firstframe, lastframe, size) for each run of consecutive frame numbers,
+    in frame order, where size is the total size of the run's frames.
+
+    With numpy, the sort, gap search and size totals are all done as array
+    operations. Without it, the same thing is done over the arrays in python.
+    """
+
+    if len(frames) == 0:
+        return []
+
+    if numpy:
+        frames = numpy.asarray(frames, dtype=numpy.int64)
+        sizes = numpy.asarray(sizes, dtype=numpy.int64)
+
+        # frames normally arrive in order already (the files are read sorted, and
+        # share the same padding), so only sort if they need it
+        steps = numpy.diff(frames)
+
+        if (steps < 0).any():
+            order = numpy.argsort(frames, kind="mergesort")
+            frames = frames[order]
+            sizes = sizes[order]
+            steps = numpy.diff(frames)
+
+        # a new run starts wherever the next frame isn't this frame + 1
+        starts = numpy.concatenate(([0], numpy.flatnonzero(steps != 1) + 1))
+        ends = numpy.concatenate((starts[1:], [len(frames)])) - 1
+        totals = numpy.add.reduceat(sizes, starts)
+
+        return [(int(frames[a]), int(frames[b]), int(t))
+                for a, b, t in zip(starts, ends, totals)]
+
+    # no numpy: same again, in python
+    for n in xrange(1, len(frames)):
+        if frames[n] < frames[n - 1]:
+            pairs = sorted(zip(frames, sizes))
+            frames = array.array(frames.typecode, [f for f, size in pairs])
+            sizes = array.array(sizes.typecode, [size for f, size in pairs])
+            break
+
+    runs = []
+    start = 0
+
+    for n in xrange(1, len(frames)):
+        if frames[n] != frames[n - 1] + 1:
+            runs.append((start, n))
+            start = n
+
+    runs.append((start, len(frames)))
+
+    return [(frames[a], frames[b - 1], sum(sizes[a:b])) for a, b in runs]
+
 
 class SequenceList():
     def __init__(self, sourcePath):
-	self.sourcePath = sourcePath
-    
+        self.sourcePath = sourcePath
+
     def Test(self):
-	print "testing.."
-    
-    def GetSequences(self, recursive=True):
-        # change working folder to input folder path
-        os.chdir(self.sourcePath)
-	
-	dirList          = []
-	fileList         = []
-	#lineCounter      = 1
-	
-	self.sequences	 = {}
-	self.subseqs 	 = {}
-	frame = re.compile('[0-9]*$')
-	
-	# This Creates a list of Directories and Files in the current path
-        for path, dirs, files in os.walk('.'):
+        print "testing.."
+
+    def GetSequences(self, recursive=True, entries=None):
+        # walk the input folder path directly rather than chdir'ing into it,
+        # so that several SequenceLists can safely run at once in different threads
+
+        # if the caller has already listed sourcePath, it can pass in the files it found
+        # as 'entries': objects with a name and a stat() method, like scandir's DirEntry.
+        # they're used instead of listing the folder again, and their (cached) stat
+        # results are used for the frame sizes. entries implies recursive=False.
+
+        # each sequence pattern maps to [fullPath, frame numbers, frame sizes]. the frame
+        # numbers and sizes are kept in typed arrays, rather than a list per frame, so that
+        # even a 500k frame scan only costs a few MB
+        self.sequences   = {}
+        self.subseqs     = {}
+
+        # This Creates a list of Directories and Files in the current path
+        if entries is not None:
+            entryMap = dict((e.name, e) for e in entries)
+            listing = [(self.sourcePath, [], entryMap.keys())]
+        else:
+            entryMap = {}
+            listing = os.walk(self.sourcePath)
+
+        for path, dirs, files in listing:
+            subdir = path[len(self.sourcePath):].lstrip(os.sep) # path relative to sourcePath ('' for sourcePath itself)
+            fullPath = os.path.join(self.sourcePath, subdir)
+            patternPath = os.path.join(fullPath, '') # sequence patterns in this folder start with this
+
+            # frames of the same sequence arrive one after another (the files are sorted),
+            # so remember the last sequence rather than looking it up for every frame
+            lastPattern = None
+            frames = sizes = None
+
             for i in sorted(files):
 
-                #if os.path.getsize(os.path.join(self.sourcePath, path, i)) < 512000: # it's a thumbnail
-                #    fileList.append(i)
-                #    continue
-		
-		# it's a file that would be part of a sequence:
-		if fnmatch.fnmatchcase(i, '*.dpx') is True \
-		    or fnmatch.fnmatchcase(i, '*.tif') is True \
-			or fnmatch.fnmatchcase(i, '*.cin') is True \
-			    or fnmatch.fnmatchcase(i, '*.exr') is True \
-				or fnmatch.fnmatchcase(i, '*.ari') is True:
-		    
-		    # discover frame number (must be at the end of filename, before extension)
-		    
-		    framenum = frame.search(os.path.splitext(i)[0]).group() # e.g. 'shot2_0547832.dpx' becomes '0547832'
-		    
-		    # see if a frame number was found;
-		    # if not, add the filename as-is to the regular file list and move on
-		    if len(framenum) == 0:
-			fileList.append(i)
-			continue     # if a frame number is not found, back out to the next item
-		    
-		    # get extension from filename
-		    ext = os.path.splitext(i)[-1]   # e.g. 'shot2_0547832.dpx' becomes '.dpx'
-	
-		    # if a frame number was found, create a formatting string to represent the padded length
-		    padding = '%' + '0' + `len(framenum)` + 'd'  # e.g. "%07d"
-		    
-		    # discover sequence name (what is left after removing frame number)
-		    name = os.path.splitext(i)[0].rstrip(framenum) # e.g. 'shot2_0547832.dpx' becomes 'shot2_'
-	
-		    # build sequence name pattern 
-		    pattern = name + padding + ext  # e.g. 'shot2_' + '%07d' + '.dpx' = 'shot2_%07d.dpx'
-	
-		    newPattern = os.path.join(self.sourcePath, path[2:], pattern)
-	
-		    frameSize = os.path.getsize(os.path.join(self.sourcePath, path, i))
-		    
-		    fullPath = os.path.join(self.sourcePath, path[2:])
-		    
-	
-		    # add item to numlist dictionary			
-		    if self.sequences.has_key(newPattern): # see if the dictionary already has a key that matches the sequence name ('shot2_%07d.dpx')
-			self.sequences[newPattern].append([int(framenum), frameSize])  # add the frame number (as integer) to
-			
-								    # the dictionary entry matching the sequence pattern
-		    else:
-			self.sequences[newPattern] = []    # otherwise, first create a new dictionary entry and associated list
-			self.sequences[newPattern].append(fullPath)
-			self.sequences[newPattern].append([int(framenum), frameSize]) # then add the current frame number (as integer)
-
-					    
-		else:	
-		    # if it's a normal file
-		    fileList.append(i)
-            
+                # it's a file that would be part of a sequence if its extension is in the table.
+                # dot > 0 skips names like '.dpx', which os.path.splitext says have no extension
+                dot = i.rfind('.')
+
+                if dot <= 0 or i[dot:] not in SEQUENCE_EXTENSIONS:
+                    continue # if it's a normal file
+
+                # discover frame number (must be at the end of filename, before extension)
+                base = i[:dot]
+                name = base.rstrip(FRAME_DIGITS) # e.g. 'shot2_0547832.dpx' becomes 'shot2_'
+
+                # see if a frame number was found; if not, move on to the next item
+                if len(name) == dot:
+                    continue
+
+                framenum = base[len(name):] # e.g. 'shot2_0547832.dpx' becomes '0547832'
+                number = int(framenum)
+
+                if number > MAX_FRAME:
+                    continue # too big to be a frame number (a timestamp, say)
+
+                # build sequence name pattern, with a formatting string to represent the padded length
+                if len(framenum) < len(PADDING):
+                    padding = PADDING[len(framenum)]
+                else:
+                    padding = '%%0%dd' % len(framenum)
+
+                pattern = patternPath + name + padding + i[dot:]  # e.g. 'shot2_' + '%07d' + '.dpx' = 'shot2_%07d.dpx'
+
+                if pattern != lastPattern:
+                    # add the frame number and size to the arrays for the sequence pattern
+                    # ('shot2_%07d.dpx'), creating them if this is the first frame
+                    if pattern not in self.sequences:
+                        self.sequences[pattern] = [fullPath, array.array('l'), array.array('l')]
+
+                    lastPattern = pattern
+                    frames = self.sequences[pattern][1]
+                    sizes = self.sequences[pattern][2]
+
+                if i in entryMap:
+                    frameSize = entryMap[i].stat().st_size
+                else:
+                    frameSize = os.path.getsize(os.path.join(path, i))
+
+                frames.append(number)
+                sizes.append(frameSize)
+
             if recursive == False:
                 break
-	
-	for k in self.sequences.keys(): # for each sequence found
-	    self.sequences[k].sort() # sort the list of associated frame numbers
-	    
-	for k in sorted(self.sequences.keys()): # go through each found sequence pattern (keys), work on a sorted list of frame numbers
-	    firstframe = self.sequences[k][0][0] # get the lowest frame number of the current sequence (say, 10000)
-
-	    lastframe = self.sequences[k][-2][0] # get the highest frame number of the current sequence(say,  900000)
-
-	    framerange = lastframe + 1 - firstframe         # see if the range matches the number of items (frame #s) in the list
-	    
-	    fullPath = self.sequences[k][-1]
-	    del self.sequences[k][-1]
-	    
-	    # if the range and number of items match, go ahead and transfer it to the new dictionary with no changes
-	
-	    if len(self.sequences[k]) == framerange and framerange > 1:
-		sub = k + '_000'        # add an index value to the sequence name pattern ('shot2_%07d.dpx' becomes 'shot2_%07d.dpx_000'
-		self.subseqs[sub] = [fullPath, self.sequences[k]] # sub is now a FULL PATH plus index number
-		
-		del self.sequences[k] # remove the item from the original dictionary and move on to the next
-	    elif framerange == 1:
-		if firstframe == lastframe:
-		    realframe = str(k) % lastframe
-		    #print realframe
-		    del self.sequences[k] # remove the item from the original dictionary and move on to the next
-		    fileList.append(realframe) # this will be a FULL PATH to the filename
-	
-	    # if the number of items does not match the range, start looking for gaps    
-	    else:
-		#print k + ' is not continuous' # tell the user that the current sequence has gaps
-		# setup variables and counters
-		gapcount = 0  
-		framecount = 0
-		subpattern = k + '_%03d' % gapcount # a string formatting expression for generating indexes ('_001')
-		startframe = self.sequences[k][0][0]
-		# scan all frame numbers in A COPY of the sequence list (to avoid enumeration errors)
-		for v in self.sequences[k][:]:
-		    vFrame = v[0]
-		    # check to see if the sequence is continuous to this point
-		    if vFrame - startframe == framecount:
-			#print `v` + ' - ' + `startframe` + ' = ' + `framecount`
-			# if the sequence is still continuous, look for an existing subsequence key,
-			# then pop() the current frame into the subsequence dictionary (removing it from the original list)
-			if self.subseqs.has_key(subpattern):
-			    self.subseqs[subpattern][1].append([vFrame, v[1]])
-			else:
-			    self.subseqs[subpattern] = []
-			    self.subseqs[subpattern].append(fullPath)
-			    self.subseqs[subpattern].append([])
-			    self.subseqs[subpattern][1].append([vFrame, v[1]])
-			# increase counter of scanned frames by 1
-			framecount += 1
-	
-		    # if a gap is encountered ( e.g. [ ..., 1000, 1001, 1050, 1051, ... ]
-		    else:
-			#
-			gapcount += 1 # increase the gapcount of the current parent sequence
-			framecount = 0 # reset the framecount for the current sub-sequence
-			subpattern = k + '_%03d' % gapcount # generate a new index value for the new sub-sequence
-			startframe = vFrame # set the startframe of the new sub-sequence to the current frame in the list (e.g. 1050)
-		
-			self.subseqs[subpattern] = [] # setup a new list to store the frames of the new sub-sequence (e.g. 'shot2_%07d.dpx_001')
-			self.subseqs[subpattern].append(fullPath)
-			self.subseqs[subpattern].append([])
-			self.subseqs[subpattern][1].append([vFrame, v[1]]) # add the first frame number of the new sub-sequence
-			framecount += 1 # increment the frame count, then go back to the top of the loop and check the next frame number
-		del self.sequences[k] # after all the frame numbers have been check for continuity, delete the parent sequence
-		    
-	
-	#print self.subseqs
-	#return
-    
-	self.sequencesToAppend = []
-    
-	for sequence in sorted(self.subseqs.keys()):
-	    #print "self.subseqs[sequence][0][1] = " + str(self.subseqs[sequence][0][1])
-	    # IMPORTANT SEQUENCE VARIABLES!
-	    sequenceName = os.path.basename(sequence)
-	    name = str(sequenceName[0:-8])
-	    ext = str(sequenceName[-8:-4])
-	    firstframe = str(self.subseqs[sequence][1][0][0])
-	    lastframe = str(self.subseqs[sequence][1][-1][0])
-	    formattedname = str(name + "[" + firstframe + "-" + lastframe + "]" + ext)
-	    fullPath = self.subseqs[sequence][0]
-	    
-	    # figure out the size
-	    size = 0
-
-	    for frame in self.subseqs[sequence][1]:
-		size += frame[1]
-	
-	    # add this list to a dictionary so that AppendItemToList can grab it later
-	    # (just trying to pass the list into the function was giving me weird errors)
-	
-	    if int(lastframe) - int(firstframe) > 0:
-		self.sequencesToAppend.append([name, ext, firstframe, lastframe, formattedname, os.path.join(fullPath, formattedname), size])
-		index = self.sequencesToAppend.index([name, ext, firstframe, lastframe, formattedname, os.path.join(fullPath, formattedname), size])
-	    else:
-		fileList.append((name + ext) % int(firstframe))
-	
-	return self.sequencesToAppend
+
+        for k in sorted(self.sequences.keys()): # go through each found sequence pattern (keys)
+            fullPath, frames, sizes = self.sequences.pop(k)
+
+            # split the frames into continuous runs. each run becomes a subsequence, with an
+            # index value added to the sequence name pattern ('shot2_%07d.dpx' becomes
+            # 'shot2_%07d.dpx_000', then 'shot2_%07d.dpx_001' after the first gap, etc)
+            for gapcount, run in enumerate(SplitFrameRuns(frames, sizes)):
+                self.subseqs[k + '_%03d' % gapcount] = [fullPath] + list(run)
+
+        self.sequencesToAppend = []
+
+        for sequence in sorted(self.subseqs.keys()):
+            # IMPORTANT SEQUENCE VARIABLES!
+            sequenceName = os.path.basename(sequence)
+            name = str(sequenceName[0:-8])
+            ext = str(sequenceName[-8:-4])
+            fullPath, firstframe, lastframe, size = self.subseqs[sequence]
+            firstframe = str(firstframe)
+            lastframe = str(lastframe)
+            formattedname = str(name + "[" + firstframe + "-" + lastframe + "]" + ext)
+
+            # single frames don't count as sequences
+            if int(lastframe) - int(firstframe) > 0:
+                self.sequencesToAppend.append([name, ext, firstframe, lastframe, formattedname, os.path.join(fullPath, formattedname), size])
+
+        return self.sequencesToAppend
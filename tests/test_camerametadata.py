@@ -0,0 +1,154 @@
+"""
+Tests for CameraMetadata
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Catalog
+import CameraMetadata
+from test_headers import dpxHeader
+from test_quicktime import makeMov
+
+
+XDCAM_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<NonRealTimeMeta xmlns="urn:schemas-professionalDisc:nonRealTimeMeta:ver.1.20" lastUpdate="2013-12-16T14:41:19+02:00">
+    <Duration value="1440"/>
+    %s
+</NonRealTimeMeta>
+'''
+
+LTC_CHANGE_TABLE = '''<LtcChangeTable tcFps="24" halfStep="false">
+        <LtcChange frameCount="0" value="%s" status="increment"/>
+        <LtcChange frameCount="1439" value="23120600" status="%s"/>
+    </LtcChangeTable>'''
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, "wb") as f:
+            f.write(data)
+
+        return path
+
+
+class TestSequences(TestCase):
+
+    def test_header_timecode(self):
+        for n in xrange(1001, 1011):
+            self.write("A001.%07d.dpx" % n, dpxHeader(0x01000000, 25.0))
+
+        info, = CameraMetadata.listDirectory(self.directory)
+
+        self.assertEqual((info["framerate"], info["source_in"], info["source_out"], info["duration"]),
+                         ("25", "01:00:00:00", "01:00:00:10", 10))
+
+    def test_no_header_timecode(self):
+        # the timecode comes from the frame numbers, at the header's rate
+        for n in xrange(101, 151):
+            self.write("A001.%07d.dpx" % n, dpxHeader(0, 25.0))
+
+        info, = CameraMetadata.listDirectory(self.directory)
+
+        self.assertEqual((info["framerate"], info["source_in"], info["source_out"], info["duration"]),
+                         ("25", "00:00:04:01", "00:00:06:01", 50))
+
+
+class TestXDCAM(TestCase):
+
+    def xdcam(self, xml):
+        "Writes an XDCAM clip folder, with xml as its NonRealTimeMeta, and returns the clip's metadata"
+
+        clip = self.write("Clip/C0001.MP4", makeMov(108000, False)) # 01:00:00:00 in its own tmcd track
+
+        for name in ("C0001M01.XML", "C0001R01.BIM", "C0001.SMI", "C0001I01.PPN"):
+            self.write("Clip/" + name, xml if name.endswith(".XML") else "")
+
+        return CameraMetadata.parseStreamingFile(clip)
+
+    def test_timecode(self):
+        info = self.xdcam(XDCAM_XML % (LTC_CHANGE_TABLE % ("00130500", "end")))
+
+        self.assertEqual((info["source_in"], info["source_out"], info["duration"]), ("00:05:13:00", "00:06:13:00", "1440"))
+
+    def test_malformed(self):
+        # none of these have a usable timecode, so the clip's own is used
+        for xml in (XDCAM_XML % "", # no LtcChangeTable
+                    XDCAM_XML % (LTC_CHANGE_TABLE % ("00130500", "increment")), # no end
+                    XDCAM_XML % (LTC_CHANGE_TABLE % ("0013", "end")), # not 8 digits
+                    XDCAM_XML % (LTC_CHANGE_TABLE % ("00130500", "end")).replace('frameCount="1439"', 'frameCount="x"'),
+                    XDCAM_XML % (LTC_CHANGE_TABLE % ("00130500", "end")).replace(' status="increment"', ''),
+                    "not XML"):
+            info = self.xdcam(xml)
+
+            self.assertEqual((info["source_in"], info["source_out"], info["duration"]), ("01:00:00:00", "01:01:00:00", "1440"))
+
+
+class TestErrors(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.parse = CameraMetadata.VIDEOMetadata.parse
+        self.stderr = sys.stderr
+
+    def tearDown(self):
+        CameraMetadata.VIDEOMetadata.parse = self.parse
+
+        if sys.stderr is not self.stderr:
+            sys.stderr.close()
+            sys.stderr = self.stderr
+
+        TestCase.tearDown(self)
+
+    def test_handler_raises(self):
+        # a file a handler can't make sense of is reported and left out, and the rest carry on
+        def parse(info, filename):
+            if filename.endswith("C0002.mov"):
+                raise Exception("Mismatched track duration")
+            return self.parse(info, filename)
+
+        CameraMetadata.VIDEOMetadata.parse = parse
+        sys.stderr = open(os.devnull, "w")
+
+        self.write("A001C0001.mov", makeMov(108000, False))
+        self.write("A001C0002.mov", makeMov(108000, False))
+
+        for n in xrange(1001, 1011):
+            self.write("A001.%07d.dpx" % n, dpxHeader(0x01000000, 25.0))
+
+        catalog = Catalog.Catalog(os.path.join(self.directory, "catalog"))
+
+        try:
+            names = [os.path.basename(i["name"]) for i in CameraMetadata.listDirectory(self.directory, catalog=catalog)]
+            self.assertEqual(names, ["A001C0001.mov", "A001.%07d[1001-1010].dpx"])
+
+            # it isn't kept in the catalog, so it's tried again next time
+            CameraMetadata.VIDEOMetadata.parse = self.parse
+
+            names = [os.path.basename(i["name"]) for i in CameraMetadata.listDirectory(self.directory, catalog=catalog)]
+            self.assertEqual(names, ["A001C0001.mov", "A001C0002.mov", "A001.%07d[1001-1010].dpx"])
+        finally:
+            catalog.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests for seq/headers
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import time
+import shutil
+import struct
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seq import headers
+
+
+def bcd(value):
+    return (value / 10) << 4 | value % 10
+
+def dpxHeader(timecode=0x01000000, framerate=24.0, endian=">"):
+    header = bytearray(2048)
+    header[0:4] = "SDPX" if endian == ">" else "XPDS"
+
+    struct.pack_into(endian + "II", header, 772, 2048, 1556)
+    struct.pack_into(endian + "f", header, 1724, framerate)
+    struct.pack_into(endian + "I", header, 1920, timecode)
+    struct.pack_into(endian + "I", header, 1940, 0xFFFFFFFF) # undefined, so the film header's rate is used
+
+    return str(header)
+
+def exrAttribute(name, kind, value):
+    return name + "\0" + kind + "\0" + struct.pack("<i", len(value)) + value
+
+def exrHeader(timecode, preview=0):
+    return "\x76\x2f\x31\x01" + struct.pack("<I", 2) + \
+           exrAttribute("channels", "chlist", "\0") + \
+           exrAttribute("preview", "preview", "\0" * preview) + \
+           exrAttribute("dataWindow", "box2i", struct.pack("<iiii", 0, 0, 1919, 1079)) + \
+           exrAttribute("framesPerSecond", "rational", struct.pack("<iI", 30000, 1001)) + \
+           exrAttribute("timeCode", "timecode", struct.pack("<II", timecode, 0)) + \
+           "\0"
+
+
+class TestHeaders(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+
+        with open(path, "wb") as f:
+            f.write(data)
+
+        return path
+
+    def test_dpx(self):
+        for endian in "<>":
+            path = self.write("A001.0001001.dpx", dpxHeader(bcd(1) << 24 | bcd(2) << 16 | bcd(3) << 8 | bcd(4), endian=endian))
+
+            self.assertEqual(headers.ReadDPXHeader(path),
+                             {"timecode": "01:02:03:04", "framerate": 24.0, "resolution": (2048, 1556)})
+
+    def test_dpx_undefined_timecode(self):
+        path = self.write("A001.0001001.dpx", dpxHeader(0xFFFFFFFF))
+
+        self.assertTrue("timecode" not in headers.ReadDPXHeader(path))
+
+    def test_not_dpx(self):
+        self.assertEqual(headers.ReadDPXHeader(self.write("x.dpx", "\0" * 2048)), None)
+        self.assertEqual(headers.ReadDPXHeader(self.write("y.dpx", "SDPX")), None)
+
+    def test_exr(self):
+        path = self.write("A001.0001001.exr", exrHeader(bcd(1) << 24 | bcd(0) << 16 | bcd(0) << 8 | bcd(12)))
+
+        self.assertEqual(headers.ReadEXRHeader(path),
+                         {"timecode": "01:00:00:12", "framerate": 29.97, "resolution": (1920, 1080)})
+
+    def test_exr_drop_frame(self):
+        path = self.write("A001.0001001.exr", exrHeader(bcd(1) << 24 | 0x40 | bcd(2)))
+
+        self.assertEqual(headers.ReadEXRHeader(path)["timecode"], "01:00:00;02")
+
+    def test_exr_large_attribute(self):
+        # the attributes we want come after one bigger than a read
+        path = self.write("A001.0001001.exr", exrHeader(bcd(1) << 24, preview=headers.EXR_READ_SIZE * 3))
+
+        self.assertEqual(headers.ReadEXRHeader(path)["timecode"], "01:00:00:00")
+
+    def test_cache(self):
+        path = self.write("A001.0001001.dpx", dpxHeader(bcd(1) << 24))
+
+        self.assertEqual(headers.ReadHeader(path)["timecode"], "01:00:00:00")
+
+        # rendered again, with a new timecode
+        self.write("A001.0001001.dpx", dpxHeader(bcd(2) << 24))
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        self.assertEqual(headers.ReadHeader(path)["timecode"], "02:00:00:00")
+
+    def test_unknown_extension(self):
+        self.assertEqual(headers.ReadHeader(self.write("x.tif", "")), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
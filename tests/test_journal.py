@@ -0,0 +1,107 @@
+"""
+Tests for Journal, and resuming a scan with MediaIndexer --resume
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, PACKAGE)
+
+import Journal
+from test_headers import dpxHeader
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csvfile = os.path.join(self.directory, "metadata.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        journal = Journal.Journal(self.csvfile)
+        journal.open()
+        journal.record("/mnt/raid", 2, 100)
+        journal.record("/mnt/raid/caf\xe9", 3, 250)
+        journal.close()
+
+        journal = Journal.Journal(self.csvfile)
+
+        self.assertEqual(journal.load(), 2)
+        self.assertEqual(journal.completed, {"/mnt/raid": 2, "/mnt/raid/caf\xe9": 3})
+        self.assertEqual((journal.rows, journal.offset), (5, 250))
+
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.filename))
+
+    def test_cut_short(self):
+        # the run died part way through writing its last line
+        with open(self.csvfile + Journal.JOURNAL_EXTENSION, "wb") as f:
+            f.write('["/mnt/raid", 2, 100]\n["/mnt/raid/A001", 3, 2')
+
+        journal = Journal.Journal(self.csvfile)
+
+        self.assertEqual(journal.load(), 1)
+        self.assertEqual((journal.rows, journal.offset), (2, 100))
+
+    def test_no_journal(self):
+        self.assertEqual(Journal.Journal(self.csvfile).load(), 0)
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.media = os.path.join(self.directory, "media")
+
+        # a sequence in each of a few directories
+        for name in ("A001", "A002", "A003", "A004"):
+            os.makedirs(os.path.join(self.media, name))
+
+            for n in xrange(1001, 1006):
+                with open(os.path.join(self.media, name, "%s.%07d.dpx" % (name, n)), "wb") as f:
+                    f.write(dpxHeader())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def index(self, csvfile, *options):
+        with open(os.devnull, "w") as null:
+            subprocess.check_call([sys.executable, os.path.join(PACKAGE, "MediaIndexer"), "--no-catalog"] +
+                                  list(options) + [self.media, csvfile], stdout=null, stderr=null)
+
+        with open(csvfile, "rb") as f:
+            return f.read()
+
+    def test_resume(self):
+        expected = self.index(os.path.join(self.directory, "full.csv"))
+        lines = expected.splitlines(True)
+
+        self.assertEqual(len(lines), 5) # the header, and a row for each sequence
+
+        # a run that finished the root and A001, and stopped part way through writing A002's rows
+        csvfile = os.path.join(self.directory, "resumed.csv")
+
+        with open(csvfile, "wb") as f:
+            f.write("".join(lines[:2]) + lines[2][:20])
+
+        with open(csvfile + Journal.JOURNAL_EXTENSION, "wb") as f:
+            f.write('["%s", 0, %d]\n' % (self.media, len(lines[0])))
+            f.write('["%s", 1, %d]\n' % (os.path.join(self.media, "A001"), len(lines[0]) + len(lines[1])))
+
+        self.assertEqual(self.index(csvfile, "--resume"), expected)
+        self.assertFalse(os.path.exists(csvfile + Journal.JOURNAL_EXTENSION))
+
+
+if __name__ == "__main__":
+    unittest.main()
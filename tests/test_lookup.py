@@ -0,0 +1,143 @@
+"""
+Tests for Lookup
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import random
+import cPickle
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Lookup
+import Timecode
+
+
+def row(tape, source_in, source_out, filepath, framerate="23.976"):
+    return {"tapename": tape, "source_in": source_in, "source_out": source_out,
+            "filepath": filepath, "framerate": framerate}
+
+def found(lookup, tape, timecode):
+    return sorted((r["filepath"], r["offset"]) for r in lookup.find(tape, timecode))
+
+
+class TestFind(unittest.TestCase):
+
+    def test_overlapping(self):
+        lookup = Lookup.Lookup().build([row("A012", "14:00:00:00", "14:05:00:00", "a"),
+                                        row("A012", "14:04:00:00", "14:10:00:00", "b"),
+                                        row("A012", "14:01:00:00", "14:02:00:00", "c"),
+                                        row("a012", "14:20:00:00", "14:30:00:00", "d")])
+
+        self.assertEqual(found(lookup, "A012", "14:01:30:00"), [("a", 2160), ("c", 720)])
+        self.assertEqual(found(lookup, "A012", "14:04:30:00"), [("a", 6480), ("b", 720)])
+        self.assertEqual(found(lookup, "a012", "14:25:00:00"), [("d", 7200)])
+
+    def test_ends_are_exclusive(self):
+        lookup = Lookup.Lookup().build([row("A012", "14:00:00:00", "14:05:00:00", "a")])
+
+        self.assertEqual(found(lookup, "A012", "14:04:59:23"), [("a", 7199)])
+        self.assertEqual(found(lookup, "A012", "14:05:00:00"), [])
+        self.assertEqual(found(lookup, "A012", "13:59:59:23"), [])
+        self.assertEqual(found(lookup, "B001", "14:00:00:00"), [])
+
+    def test_past_midnight(self):
+        lookup = Lookup.Lookup().build([row("B001", "23:59:00;02", "00:01:00;02", "b", "29.97")])
+
+        self.assertEqual(found(lookup, "B001", "23:59:30;00"), [("b", 898)])
+        self.assertEqual(found(lookup, "B001", "00:00:10;00"), [("b", 2098)])
+        self.assertEqual(found(lookup, "B001", "00:01:00;02"), [])
+
+    def test_brute_force(self):
+        rng = random.Random(0)
+        rows = []
+
+        for n in xrange(2000):
+            start = rng.randrange(0, 86400 * 24 - 5000)
+            rows.append(row("T%d" % (n % 3), Timecode.fromFrames(start, 24),
+                            Timecode.fromFrames(start + rng.randrange(1, 5000), 24), str(n), "24"))
+
+        lookup = Lookup.Lookup().build(rows)
+
+        for n in xrange(500):
+            frame = rng.randrange(0, 86400 * 24)
+            tape = "T%d" % (n % 3)
+            expected = sorted(r["filepath"] for r in rows if r["tapename"] == tape and
+                              Timecode.toFrames(r["source_in"], 24) <= frame < Timecode.toFrames(r["source_out"], 24))
+
+            self.assertEqual(sorted(r["filepath"] for r in lookup.find(tape, Timecode.fromFrames(frame, 24))), expected)
+
+    def test_no_framerate(self):
+        # e.g. ARRIRAW, or a sequence whose headers don't have one, which the indexer counts at 23.976
+        lookup = Lookup.Lookup().build([row("A001", "01:00:00:00", "01:00:10:00", "a", ""),
+                                        row("", "01:00:00:00", "01:00:10:00", "b"),
+                                        row("C001", "", "", "c")])
+
+        self.assertEqual(found(lookup, "A001", "01:00:05:00"), [("a", 120)])
+        self.assertEqual(lookup.skipped, 2)
+
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = os.path.join(self.directory, "metadata.csv")
+
+        with open(self.index, "wb") as f:
+            f.write('"tapename","source_in","source_out","filepath","framerate"\n')
+            f.write('"A012","14:00:00:00","14:05:00:00","/m/a.mov","23.976"\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved(self):
+        lookup = Lookup.load(self.index)
+        saved = self.index + Lookup.LOOKUP_EXTENSION
+
+        self.assertTrue(os.path.exists(saved))
+        self.assertEqual(found(Lookup.load(saved), "A012", "14:00:00:01"), [("/m/a.mov", 1)])
+        self.assertEqual(found(Lookup.load(self.index), "A012", "14:00:00:01"), found(lookup, "A012", "14:00:00:01"))
+
+    def test_other_version(self):
+        saved = self.index + Lookup.LOOKUP_EXTENSION
+
+        with open(saved, "wb") as f:
+            cPickle.dump({"version": Lookup.LOOKUP_VERSION - 1, "lookup": None}, f, 2)
+
+        self.assertEqual(found(Lookup.load(saved), "A012", "14:00:00:01"), [("/m/a.mov", 1)])
+
+        os.remove(self.index)
+
+        with open(saved, "wb") as f:
+            f.write("not a lookup")
+
+        self.assertRaises(ValueError, Lookup.load, saved)
+
+
+class TestQueries(unittest.TestCase):
+
+    def test_edl_and_pairs(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "TITLE: REEL1\n"
+                     "001  A012     V     C        14:04:30:00 14:04:31:00 01:00:00:00 01:00:01:00\n"
+                     "* FROM CLIP NAME: A012C001\n"
+                     "002  A012     V     D    024 14:25:00:00 14:25:01:00 01:00:01:00 01:00:02:00\n"
+                     "# a comment\n"
+                     "B001,23:59:30;00\n")
+        os.close(fd)
+
+        try:
+            self.assertEqual(list(Lookup.readQueries(path)), [("001", "A012", "14:04:30:00"),
+                                                               ("002", "A012", "14:25:00:00"),
+                                                               ("6", "B001", "23:59:30;00")])
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Tests for QuickTime
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import QuickTime
+
+
+def box(kind, payload):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+def trak(handler, timescale, duration, stsd, stts, stco):
+    mdhd = box("mdhd", "\0" * 4 + struct.pack(">IIII", 0, 0, timescale, duration) + "\0" * 4)
+    hdlr = box("hdlr", "\0" * 4 + "mhlr" + handler + "\0" * 12)
+    stbl = box("stbl", box("stsd", stsd) + box("stts", stts) + box("stco", stco))
+
+    return box("trak", box("mdia", mdhd + hdlr + box("minf", stbl)))
+
+def makeMov(frame, dropFrame, frames=1440, timecode=True):
+    "A 23.976 MOV of frames frames, with a 30 fps tmcd track starting at frame"
+
+    ftyp = box("ftyp", "qt  " + "\0" * 4)
+    mdat = box("mdat", struct.pack(">I", frame) + "\0" * 1000)
+    offset = len(ftyp) + 8 # the timecode sample, at the start of mdat
+
+    video = trak("vide", 24000, frames * 1001,
+                 "\0" * 8,
+                 "\0" * 4 + struct.pack(">III", 1, frames, 1001),
+                 "\0" * 4 + struct.pack(">II", 1, offset + 4))
+
+    tmcd = trak("tmcd", 30000, frames * 1001 * 30000 / 24000,
+                "\0" * 4 + struct.pack(">I", 1) + struct.pack(">I4s", 34, "tmcd") + "\0" * 8 +
+                struct.pack(">IIIIBB", 0, 1 if dropFrame else 0, 30000, 1001, 30, 0),
+                "\0" * 4 + struct.pack(">III", 1, 1, 1001),
+                "\0" * 4 + struct.pack(">II", 1, offset))
+
+    return ftyp + mdat + box("moov", video + (tmcd if timecode else ""))
+
+
+class TestProbe(unittest.TestCase):
+
+    def probe(self, data):
+        fd, path = tempfile.mkstemp(suffix=".mov")
+
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            return QuickTime.probe(path)
+        finally:
+            os.remove(path)
+
+    def test_non_drop_frame(self):
+        info = self.probe(makeMov(108000, False))
+
+        self.assertEqual(info, {"framerate": "23.976", "frames": 1440, "timecode": "01:00:00:00"})
+
+    def test_drop_frame(self):
+        info = self.probe(makeMov(107892, True))
+
+        self.assertEqual(info["timecode"], "01:00:00;00")
+
+    def test_no_timecode_track(self):
+        info = self.probe(makeMov(0, False, timecode=False))
+
+        self.assertEqual(info["framerate"], "23.976")
+        self.assertEqual(info["timecode"], None)
+
+    def test_not_quicktime(self):
+        self.assertEqual(self.probe("\0" * 64), None)
+        self.assertEqual(self.probe(makeMov(0, False)[:40]), None)
+
+
+class TestBoxes(unittest.TestCase):
+
+    def test_find(self):
+        data = box("moov", box("trak", box("mdia", box("hdlr", "x" * 12))))
+
+        self.assertEqual(QuickTime.find(data, ["moov", "trak", "mdia", "hdlr"]), (32, 44))
+        self.assertEqual(QuickTime.find(data, ["moov", "udta"]), None)
+
+    def test_cut_short(self):
+        data = box("free", "") + struct.pack(">I4s", 100, "moov")
+
+        self.assertEqual([kind for kind, start, end in QuickTime.boxes(data)], ["free"])
+
+
+if __name__ == "__main__":
+    unittest.main()
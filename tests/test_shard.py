@@ -0,0 +1,120 @@
+"""
+Tests for Shard
+
+    python -m unittest discover tests
+"""
+
+import os
+import csv
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Shard
+
+
+HEADER = ["name", "filepath"]
+
+
+class TestMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def scan(self, rootpaths, directories, count):
+        """
+        Writes a partial CSV and manifest for each of count shards, as if each had scanned
+        its part of directories ([(directory, rows)], in walk order). Returns the partials.
+        """
+
+        partials = []
+
+        for index in xrange(1, count + 1):
+            shard = Shard.Shard(index, count)
+            partial = os.path.join(self.directory, "part%02d.csv" % index)
+            manifest = Shard.Manifest(partial, shard, rootpaths)
+
+            with open(partial, "wb") as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+                writer.writerow(HEADER)
+
+                for directory, rows in directories:
+                    i, name = Shard.blockKey(rootpaths, directory)
+
+                    # a root path, or the top-level directory it's under
+                    if not (shard.include(directory, 0) if not name else shard.include(os.path.join(rootpaths[i], name), 1)):
+                        continue
+
+                    for n in xrange(rows):
+                        writer.writerow(["%d" % n, directory])
+
+                    manifest.add(directory, rows)
+
+            manifest.write()
+            partials.append(partial)
+
+        return partials
+
+    def merged(self, partials):
+        output = os.path.join(self.directory, "merged.csv")
+
+        total = Shard.merge(partials, output, HEADER)
+
+        with open(output, "rb") as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], HEADER)
+        self.assertEqual(total, len(rows) - 1)
+
+        return [tuple(row) for row in rows[1:]]
+
+    def test_order(self):
+        rootpaths = ["/mnt/raid", "/mnt/ltfs"]
+        directories = [("/mnt/raid", 2),
+                       ("/mnt/raid/A001", 3), ("/mnt/raid/A001/CLIPS", 1),
+                       ("/mnt/raid/B002", 0),
+                       ("/mnt/raid/C003", 2),
+                       ("/mnt/ltfs", 1),
+                       ("/mnt/ltfs/A001", 2),
+                       ("/mnt/ltfs/D004", 4), ("/mnt/ltfs/D004/x", 1), ("/mnt/ltfs/D004/y", 1)]
+
+        expected = [("%d" % n, d) for d, rows in directories for n in xrange(rows)]
+
+        for count in (1, 2, 3, 5):
+            partials = self.scan(rootpaths, directories, count)
+            self.assertEqual(self.merged(partials), expected)
+
+            for p in partials:
+                os.remove(p)
+                os.remove(p + Shard.MANIFEST_EXTENSION)
+
+    def test_non_ascii(self):
+        # a latin-1 name isn't valid UTF-8, but paths are just bytes
+        rootpaths = ["/mnt/caf\xe9"]
+        directories = [("/mnt/caf\xe9", 1), ("/mnt/caf\xe9/caf\xe9", 2), ("/mnt/caf\xe9/caf\xc3\xa9", 1)]
+
+        partials = self.scan(rootpaths, directories, 2)
+
+        for p in partials:
+            manifest = Shard.readManifest(p)
+            self.assertEqual(manifest["rootpaths"], rootpaths)
+
+            for i, name, rows in manifest["blocks"]:
+                self.assertTrue(name in ("", "caf\xe9", "caf\xc3\xa9"))
+
+        self.assertEqual(sorted(self.merged(partials)), sorted(("%d" % n, d) for d, rows in directories for n in xrange(rows)))
+
+    def test_missing_shard(self):
+        partials = self.scan(["/mnt/raid"], [("/mnt/raid", 1), ("/mnt/raid/A001", 1)], 3)
+
+        self.assertRaises(ValueError, Shard.merge, partials[:2], os.path.join(self.directory, "merged.csv"), HEADER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for Timecode
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Timecode
+
+
+class TestNonDropFrame(unittest.TestCase):
+
+    def test_toFrames(self):
+        self.assertEqual(Timecode.toFrames("00:00:00:00", 24), 0)
+        self.assertEqual(Timecode.toFrames("01:00:00:00", 24), 86400)
+        self.assertEqual(Timecode.toFrames("00:01:00:00", 30), 1800)
+        self.assertEqual(Timecode.toFrames("00:10:00:00", 30), 18000)
+
+    def test_invalid(self):
+        self.assertEqual(Timecode.toFrames("00:00:00:24", 24), None)
+        self.assertEqual(Timecode.toFrames("00:60:00:00", 24), None)
+        self.assertEqual(Timecode.toFrames("bogus", 24), None)
+        self.assertEqual(Timecode.toFrames("01:00:00:00", 0), None)
+
+    def test_fromFrames(self):
+        self.assertEqual(Timecode.fromFrames(86401, 24), "01:00:00:01")
+        self.assertEqual(Timecode.fromFrames(1800, 30), "00:01:00:00")
+        self.assertEqual(Timecode.fromFrames(Timecode.framesPerDay(24), 24), "00:00:00:00")
+
+    def test_offset_at_29_97(self):
+        # 29.97 footage with non-drop timecode counts every label
+        self.assertEqual(Timecode.offset("00:00:59:29", 1, "29.97"), "00:01:00:00")
+        self.assertEqual(Timecode.offset("01:00:00:00", 18000, "29.97"), "01:10:00:00")
+        self.assertEqual(Timecode.offset("00:09:59:29", 1, "29.970"), "00:10:00:00")
+
+    def test_offset(self):
+        self.assertEqual(Timecode.offset("01:00:00:00", 48, "23.976"), "01:00:02:00")
+        self.assertEqual(Timecode.offset("23:59:59:23", 1, "24"), "00:00:00:00")
+        self.assertEqual(Timecode.offset("01:00:00:00", 1, "bogus"), None)
+        self.assertEqual(Timecode.offset("bogus", 1, "24"), None)
+
+
+class TestDropFrame(unittest.TestCase):
+
+    def test_minute_boundary(self):
+        self.assertEqual(Timecode.toFrames("00:00:59;29", 30), 1799)
+        self.assertEqual(Timecode.toFrames("00:01:00;02", 30), 1800)
+        self.assertEqual(Timecode.fromFrames(1799, 30, True), "00:00:59;29")
+        self.assertEqual(Timecode.fromFrames(1800, 30, True), "00:01:00;02")
+        self.assertEqual(Timecode.offset("00:00:59;29", 1, "29.97"), "00:01:00;02")
+
+    def test_ten_minute_boundary(self):
+        # every tenth minute keeps its first frame numbers
+        self.assertEqual(Timecode.toFrames("00:10:00;00", 30), 17982)
+        self.assertEqual(Timecode.fromFrames(17982, 30, True), "00:10:00;00")
+        self.assertEqual(Timecode.offset("00:09:59;29", 1, "29.97"), "00:10:00;00")
+        self.assertEqual(Timecode.toFrames("01:00:00;00", 30), 107892)
+
+    def test_skipped_labels(self):
+        self.assertEqual(Timecode.toFrames("00:01:00;00", 30), None)
+        self.assertEqual(Timecode.toFrames("00:01:00;01", 30), None)
+        self.assertEqual(Timecode.toFrames("00:01:00:00", 30, True), None)
+        self.assertEqual(Timecode.toFrames("00:01:00;03", 60), None)
+        self.assertEqual(Timecode.toFrames("00:10:00;00", 30, True), 17982)
+
+    def test_59_94(self):
+        self.assertEqual(Timecode.toFrames("00:01:00;04", 60), 3600)
+        self.assertEqual(Timecode.fromFrames(3600, 60, True), "00:01:00;04")
+
+    def test_round_trip(self):
+        for fps in (30, 60):
+            frames = range(0, Timecode.framesPerDay(fps, True), 101)
+            timecodes = Timecode.fromFramesBatch(frames, fps, True)
+
+            self.assertEqual(Timecode.toFramesBatch(timecodes, fps), frames)
+
+    def test_separator(self):
+        self.assertTrue(Timecode.isDropFrame("01:00:00;00"))
+        self.assertTrue(Timecode.isDropFrame("01:00:00.00"))
+        self.assertFalse(Timecode.isDropFrame("01:00:00:00"))
+        self.assertEqual(Timecode.fromFrames(1800, 30, True, ':'), "00:01:00:02")
+
+
+if __name__ == "__main__":
+    unittest.main()
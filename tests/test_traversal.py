@@ -0,0 +1,180 @@
+"""
+Tests for Traversal
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Traversal
+
+
+def makeTree(root, names):
+    "Makes a directory under root for each of names (paths relative to root)"
+
+    for name in names:
+        if not os.path.isdir(os.path.join(root, name)):
+            os.makedirs(os.path.join(root, name))
+
+def osWalk(rootpaths):
+    "The directories under rootpaths in os.walk order, with subdirectories sorted by name"
+
+    order = []
+
+    for rootpath in rootpaths:
+        for directory, subdirs, files in os.walk(rootpath):
+            subdirs.sort()
+            order.append(directory)
+
+    return order
+
+
+class TestWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.directory, name) for name in ("raid", "ltfs")]
+
+        # an uneven tree, a few levels deep
+        rng = random.Random(0)
+        names = []
+
+        for root in ("raid", "ltfs"):
+            for a in xrange(rng.randrange(3, 8)):
+                for b in xrange(rng.randrange(0, 6)):
+                    for c in xrange(rng.randrange(0, 3)):
+                        names.append("%s/A%03d/B%03d/C%03d" % (root, a, b, c))
+                    names.append("%s/A%03d/B%03d" % (root, a, b))
+                names.append("%s/A%03d" % (root, a))
+
+        makeTree(self.directory, names)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def walk(self, threads, window):
+        # directories further down the tree take longer, so they finish out of order
+        rng = random.Random(threads)
+        delays = dict((d, rng.random() * 0.002 * d.count(os.sep)) for d in osWalk(self.roots))
+        held = [0, 0] # finished and not yet yielded now, most at once
+        lock = threading.Lock()
+
+        def process(directory, entries):
+            threading.Event().wait(delays[directory])
+
+            with lock:
+                held[0] += 1
+                held[1] = max(held)
+
+            return len(entries)
+
+        results = []
+
+        for directory, result in Traversal.walk(self.roots, process, threads=threads, window=window):
+            with lock:
+                held[0] -= 1
+
+            results.append((directory, result))
+
+        return results, held[1]
+
+    def test_order(self):
+        expected = [(d, len(os.listdir(d))) for d in osWalk(self.roots)]
+
+        self.assertEqual(self.walk(1, 1)[0], expected)
+
+        for threads, window in ((8, 2), (8, Traversal.DEFAULT_WINDOW), (32, 4)):
+            results, held = self.walk(threads, window)
+
+            self.assertEqual(results, expected)
+
+            # finished directories waiting their turn are capped at the window, plus the
+            # ones that had already been started when it filled up
+            self.assertTrue(held <= window + threads, (threads, window, held))
+
+    def test_errors(self):
+        def process(directory, entries):
+            if directory.endswith("A001"):
+                raise ValueError(directory)
+            return directory
+
+        self.assertRaises(ValueError, list, Traversal.walk(self.roots, process, threads=4, window=2))
+
+    def test_unreadable(self):
+        # a root that can't be listed is skipped, like os.walk
+        roots = [os.path.join(self.directory, "gone")] + self.roots
+
+        self.assertEqual([d for d, result in Traversal.walk(roots, lambda d, e: None, threads=4)], osWalk(self.roots))
+
+
+class TestDevices(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.slow = os.path.join(self.directory, "slow")
+        self.fast = os.path.join(self.directory, "fast")
+
+        makeTree(self.slow, ["A%03d" % n for n in xrange(6)])
+        makeTree(self.fast, ["B%03d/C" % n for n in xrange(6)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_slow_device_first(self):
+        # every directory on the slow device waits until the fast device is done. with one
+        # directory at a time on each device, the slow one can't take every thread
+        fastDone = threading.Event()
+        fastLeft = [len(osWalk([self.fast]))]
+        lock = threading.Lock()
+
+        def device(directory):
+            return "slow" if directory.startswith(self.slow) else "fast"
+
+        def process(directory, entries):
+            if device(directory) == "slow":
+                return fastDone.wait(2)
+
+            with lock:
+                fastLeft[0] -= 1
+
+                if not fastLeft[0]:
+                    fastDone.set()
+
+            return True
+
+        results = list(Traversal.walk([self.slow, self.fast], process, threads=4, window=32, deviceJobs=1, device=device))
+
+        self.assertEqual([d for d, result in results], osWalk([self.slow, self.fast]))
+        self.assertTrue(all(result for d, result in results))
+
+    def test_st_dev(self):
+        # everything's on the one device here, so it's one directory at a time
+        running = [0, 0] # now, most at once
+        lock = threading.Lock()
+
+        def process(directory, entries):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+
+            threading.Event().wait(0.01)
+
+            with lock:
+                running[0] -= 1
+
+        results = list(Traversal.walk([self.slow, self.fast], process, threads=4, deviceJobs=1))
+
+        self.assertEqual([d for d, result in results], osWalk([self.slow, self.fast]))
+        self.assertEqual(running[1], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()